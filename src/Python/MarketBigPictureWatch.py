@@ -1,34 +1,50 @@
 # big_picture.py
 
 import os
+import sys
+import gc
+import math
+import time
 from datetime import date, datetime, timedelta
 
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
 import yfinance as yf
 from pandas_datareader import data as pdr
 import requests
-from io import StringIO
+from html.parser import HTMLParser
+import codecs
 import pickle
+import json
+import argparse
+import bisect
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from vintage_store import VintageStore
+from tile_export import export_tiles
+from shm_store import SharedSeriesStore, attach as attach_shared
+from derived_cache import DerivedCache
+from figure_templates import TemplateCache
+from online_stats import OnlineStats
+import profiling
+from rate_limit import Provider
+from alert_rules import AlertEngine, emit, load_rules
+from relative_value import log_price_matrix, return_spread_matrix, zscore_matrix
+from yield_curve import TENORS, build_curve, curve_spread, interpolate_curve
 
 # --------------------------------------------------
 # Configuration
 # --------------------------------------------------
 
-print("Loading packages...")
-plt.switch_backend("Agg")  # remove this line if you want interactive windows
-print("Done.\n")
-
-# macro_yrs_ultralong = 20
-macro_yrs_ultralong = 30
-future_yrs_long = 8
-future_yrs_short = 1
-date_plotend = date.today()
-
-legend_fontsize = 10
-dpi = 109
-figsize = (1920 / dpi, 1080 / dpi)
 date_fmt = "%Y-%m-%d"
 isverbose = True
 nrows_verbose = 5
@@ -36,13 +52,68 @@ nrows_verbose = 5
 # directory for pictures
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PIC_DIR = os.path.join(BASE_DIR, "pictures")
-os.makedirs(PIC_DIR, exist_ok=True)
+
+# Defaults for everything that can be set from a JSON config file (--config)
+# or the command line; see make_config() and parse_args().
+DEFAULT_CONFIG = {
+    # "macro_yrs_ultralong": 20,
+    "macro_yrs_ultralong": 30,
+    "future_yrs_long": 8,
+    "future_yrs_short": 1,
+    "date_plotend": None,  # "YYYY-MM-DD", None means today
+    "legend_fontsize": 10,
+    "inflation_baseline_yrs": 10,  # the inflation indices are 100 this many years ago
+    "dpi": 109,
+    "width_px": 1920,
+    "height_px": 1080,
+    "isverbose": True,
+    "fetch_workers": 8,  # concurrent downloads
+    "render_workers": None,  # processes rendering --batch variants, None: one per core
+    "output_dir": PIC_DIR,
+    # every download is also recorded in this vintage store (None: off)
+    "vintage_dir": "MarketBigPictureWatch_vintages",
+    # "YYYY-MM-DD": plot the data as known on that date from the vintage
+    # store instead of downloading
+    "vintage_asof": None,
+    # directory to export the series as zoomable JSON tiles to (None: off)
+    "tiles_dir": None,
+    # directory to write per-stage profiles and flame graph stacks to (None: off)
+    "profile_dir": None,
+    # JSON file of alert rules evaluated after each refresh (see
+    # alert_rules.py), and a file the alerts are appended to besides stdout
+    "alert_rules": None,
+    "alert_log": None,
+    "figures": None,  # figure names, None means all of FIGURES
+    # extra all_data keys to download/derive besides what the figures need
+    "series": [
+        "SP500_gdpdef",
+        "SP500_deflgdp",
+        "ratio_white",
+        "ratio_black",
+        "ratio_hispanic",
+        "ratio_asian",
+    ],
+    "cities_of_interest": [
+        "National",
+        "Chicago",
+        "SanFrancisco",
+        "LosAngeles",
+        "SanDiego",
+        "Portland",
+        "Seattle",
+        "Phoenix",
+        "Dallas",
+    ],
+}
 
 
 # --------------------------------------------------
 # Helper functions
 # --------------------------------------------------
 
+_yahoo_lock = threading.Lock()
+
+
 def _print_head(df, name):
     if isverbose:
         print(f"{name} head:")
@@ -57,11 +128,13 @@ def get_daily_data_from_fred(series_name, date_start, date_end, name=None):
     """
     if name is None:
         name = series_name
-    df = pdr.DataReader(series_name, "fred", date_start, date_end)
-    df = df.reset_index()
-    df.columns = ["date", "value"]
-    df = df.dropna(subset=["value"])
-    df = df.sort_values("date")
+    with profiling.stage("fetch"):
+        df = pdr.DataReader(series_name, "fred", date_start, date_end)
+    with profiling.stage("parse"):
+        df = df.reset_index()
+        df.columns = ["date", "value"]
+        df = df.dropna(subset=["value"])
+        df = df.sort_values("date")
     _print_head(df, f"FRED {name}")
     return df
 
@@ -78,54 +151,126 @@ def get_daily_data_from_yahoo(symbol, date_start, date_end, name=None):
     start_str = date_start.strftime(date_fmt)
     end_str = (date_end + timedelta(days=1)).strftime(date_fmt)
 
-    df = yf.download(symbol, start=start_str, end=end_str, progress=False)
+    # yf.download keeps its results in module-level state, so calls from the
+    # download threads must not overlap: PROVIDERS["yahoo"] holds _yahoo_lock
+    with profiling.stage("fetch"):
+        df = yf.download(symbol, start=start_str, end=end_str, progress=False)
     if df.empty:
         raise RuntimeError(f"Yahoo returned no data for {symbol}")
 
-    df = df.reset_index()
-    # yfinance returns 'Date' or 'Datetime' as column 0
-    if "Date" in df.columns:
-        df.rename(columns={"Date": "date"}, inplace=True)
-    elif "Datetime" in df.columns:
-        df.rename(columns={"Datetime": "date"}, inplace=True)
-    df = df[["date", "Close"]]
-    df.columns = ["date", "value"]
-    df = df.dropna(subset=["value"])
-    df = df.sort_values("date")
+    with profiling.stage("parse"):
+        df = df.reset_index()
+        # yfinance returns 'Date' or 'Datetime' as column 0
+        if "Date" in df.columns:
+            df.rename(columns={"Date": "date"}, inplace=True)
+        elif "Datetime" in df.columns:
+            df.rename(columns={"Datetime": "date"}, inplace=True)
+        df = df[["date", "Close"]]
+        df.columns = ["date", "value"]
+        df = df.dropna(subset=["value"])
+        df = df.sort_values("date")
     _print_head(df, f"Yahoo {name}")
     return df
 
 
-def get_shiller_pe_from_multpl() -> pd.DataFrame:
-    URL = "https://www.multpl.com/shiller-pe/table/by-month"
-    
-    # Download page
-    resp = requests.get(URL, timeout=30)
-    resp.raise_for_status()
-
-    # Parse all tables on the page
-    tables = pd.read_html(StringIO(resp.text))
-
-    # Multpl’s Shiller PE by-month table is the first table on this page
-    df = tables[0]
+class _MultplTableParser(HTMLParser):
+    """
+    Collects the (date, value) cell texts of the first table on a Multpl
+    page. Rows come newest first; once a row dated before stop_before is
+    seen, done is set and the remaining rows are ignored.
+    """
 
-    # Typical columns: ['Date', 'Value']
-    # Clean up types
-    df["date"] = [pd.Timestamp(d) for d in df["Date"]]
-    df["value"] = (
-        df["Value"]
-        .astype(str)
-        .str.replace(",", "", regex=False)
-        .astype(float)
-    )
+    def __init__(self, stop_before=None):
+        super().__init__()
+        self.stop_before = stop_before
+        self.dates, self.values = [], []
+        self.done = False
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == "tr":
+            self._row = []
+        elif tag == "td" and self._row is not None:
+            self._cell = []
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        if tag == "td" and self._cell is not None:
+            self._row.append("".join(self._cell).strip())
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if len(self._row) >= 2:
+                self._add_row(*self._row[:2])
+            self._row = None
+        elif tag == "table" and self.dates:
+            self.done = True
+
+    def _add_row(self, date_str, value_str):
+        if self.stop_before is not None:
+            if datetime.strptime(date_str, "%b %d, %Y") < self.stop_before:
+                self.done = True
+                return
+        self.dates.append(date_str)
+        self.values.append(value_str)
+
+
+def get_shiller_pe_from_multpl(cached=None, table="shiller-pe") -> pd.DataFrame:
+    """
+    Fetch the Shiller PE 10 by-month table from Multpl and return DataFrame
+    with columns: date, value
 
-    # Sort ascending by date
-    df = df.sort_values("date").reset_index(drop=True)
-    df = df.drop(columns=["Value", "Date"])
+    If cached (an earlier result) is given, the page is streamed only until
+    the rows older than the last cached month, and the new rows are merged
+    into the cached history.
+    """
+    URL = f"https://www.multpl.com/{table}/table/by-month"
+
+    # Re-read the last cached month: its newest row is a provisional value
+    stop_before = None
+    if cached is not None and not cached.empty:
+        stop_before = cached["date"].max().to_period("M").to_timestamp()
+
+    # Stream the page and stop reading once the parser has all it needs
+    parser = _MultplTableParser(stop_before)
+    with profiling.stage("fetch"), requests.get(URL, timeout=30, stream=True) as resp:
+        resp.raise_for_status()
+        decoder = codecs.getincrementaldecoder(resp.encoding or "utf-8")("replace")
+        for chunk in resp.iter_content(chunk_size=16384):
+            with profiling.stage("parse"):
+                parser.feed(decoder.decode(chunk))
+            if parser.done:
+                break
+    if not parser.dates:
+        raise RuntimeError(f"Multpl returned no rows from {URL}")
+
+    with profiling.stage("parse"):
+        df = pd.DataFrame({
+            "date": pd.to_datetime(parser.dates, format="%b %d, %Y"),
+            "value": pd.Series(parser.values)
+            .str.replace(",", "", regex=False)
+            .str.extract(r"(-?\d+(?:\.\d+)?)", expand=False)
+            .astype(float),
+        })
+
+        if stop_before is not None:
+            df = pd.concat([cached[cached["date"] < stop_before], df])
+
+        # Sort ascending by date
+        df = df.sort_values("date", kind="stable").drop_duplicates("date", keep="last")
+        df = df.reset_index(drop=True)
     _print_head(df, "Multpl Shiller PE 10")
 
     return df
 
+
 def calc_two_dataframes(data1, operator, data2):
     """
     Align on 'date' and apply elementwise operator on the 'value' columns.
@@ -150,28 +295,73 @@ def calc_two_dataframes(data1, operator, data2):
 
 
 # --------------------------------------------------
-# Date ranges
+# Config and date ranges
 # --------------------------------------------------
 
-date_plotstart = date_plotend - timedelta(days=int(round(macro_yrs_ultralong * 365.25)))
-date_future_plotstart_long = date_plotend - timedelta(days=int(round(future_yrs_long * 365.25)))
-date_future_plotstart_short = date_plotend - timedelta(days=int(round(future_yrs_short * 365.25)))
-
-# Convert global limits to pandas Timestamps for Matplotlib
-xlim_start = pd.Timestamp(date_plotstart)
-xlim_end = pd.Timestamp(date_plotend)
-
-cities_of_interest = [
-    "National",
-    "Chicago",
-    "SanFrancisco",
-    "LosAngeles",
-    "SanDiego",
-    "Portland",
-    "Seattle",
-    "Phoenix",
-    "Dallas",
-]
+def make_config(overrides=None):
+    """
+    Merge overrides into DEFAULT_CONFIG and add the values computed from it:
+    date ranges, xlim_start/xlim_end, todaystr, figsize and the alert rules.
+    The series the alert rules look at are added to cfg["series"].
+    """
+    overrides = dict(overrides or {})
+    unknown = set(overrides) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown config keys: {', '.join(sorted(unknown))}")
+    cfg = dict(DEFAULT_CONFIG)
+    cfg.update(overrides)
+
+    unknown = set(cfg["cities_of_interest"]) - set(CaseShillerIndexID)
+    if unknown:
+        raise ValueError(f"Unknown Case-Shiller cities: {', '.join(sorted(unknown))}")
+    if len(cfg["cities_of_interest"]) > len(colors):
+        raise ValueError(f"At most {len(colors)} Case-Shiller cities can be plotted")
+
+    if cfg["figures"] is None:
+        cfg["figures"] = [f[0] for f in FIGURES]
+    figure_names = [f[0] for f in FIGURES]
+    cfg["figures"] = [
+        f"BigPicture{f}" if str(f).isdigit() else f for f in cfg["figures"]
+    ]
+    unknown = set(cfg["figures"]) - set(figure_names)
+    if unknown:
+        raise ValueError(f"Unknown figures: {', '.join(sorted(unknown))}")
+
+    cfg["alerts"] = load_rules(cfg["alert_rules"]) if cfg["alert_rules"] else []
+    rule_keys = [rule["series"].split("/")[0] for rule in cfg["alerts"]]
+    cfg["series"] = list(cfg["series"]) + [
+        k for k in dict.fromkeys(rule_keys) if k not in cfg["series"]
+    ]
+    unknown = set(cfg["series"]) - set(all_series_keys(cfg))
+    if unknown:
+        raise ValueError(f"Unknown series: {', '.join(sorted(unknown))}")
+    if cfg["vintage_asof"] and not cfg["vintage_dir"]:
+        raise ValueError("vintage_asof needs a vintage_dir to read the vintages from")
+
+    date_plotend = cfg["date_plotend"] or cfg["vintage_asof"] or date.today()
+    if isinstance(date_plotend, str):
+        date_plotend = datetime.strptime(date_plotend, date_fmt).date()
+    cfg["date_plotend"] = date_plotend
+    cfg["date_plotstart"] = date_plotend - timedelta(
+        days=int(round(cfg["macro_yrs_ultralong"] * 365.25))
+    )
+    cfg["date_future_plotstart_long"] = date_plotend - timedelta(
+        days=int(round(cfg["future_yrs_long"] * 365.25))
+    )
+    cfg["date_future_plotstart_short"] = date_plotend - timedelta(
+        days=int(round(cfg["future_yrs_short"] * 365.25))
+    )
+
+    # Convert limits to pandas Timestamps for Matplotlib
+    cfg["xlim_start"] = pd.Timestamp(cfg["date_plotstart"])
+    cfg["xlim_end"] = pd.Timestamp(date_plotend)
+    cfg["todaystr"] = date_plotend.strftime(date_fmt)
+    # the last date of data shown: date_plotend, except in backtests whose
+    # axes extend past the date they show (see backtest_configs)
+    cfg["date_dataend"] = date_plotend
+    cfg["figsize"] = (cfg["width_px"] / cfg["dpi"], cfg["height_px"] / cfg["dpi"])
+    return cfg
+
 
 colors = [
     "black",
@@ -188,378 +378,572 @@ colors = [
     "brown",
 ]
 
+CaseShillerIndexID = {
+    "City20": "SPCS20RSA",
+    "Chicago": "CHXRSA",
+    "SanFrancisco": "SFXRSA",
+    "LosAngeles": "LXXRSA",
+    "SanDiego": "SDXRSA",
+    "NewYork": "NYXRSA",
+    "Portland": "POXRSA",
+    "Seattle": "SEXRSA",
+    "Atlanta": "ATXRSA",
+    "Boston": "BOXRSA",
+    "Charlotte": "CRXRSA",
+    "Cleveland": "CEXRSA",
+    "Dallas": "DAXRSA",
+    "Denver": "DNXRSA",
+    "Detroit": "DEXRSA",
+    "LasVegas": "LVXRSA",
+    "Miami": "MIXRSA",
+    "Minneapolis": "MNXRSA",
+    "Phoenix": "PHXRSA",
+    "Tampa": "TPXRSA",
+    "WashingtonDC": "WDXRSA",
+    "City10": "SPCS10RSA",
+    "National": "CSUSHPISA",
+}
+
+# Futures (Yahoo)
+futures_underlying = [
+    "USDIndex",
+    "EURIndex",
+    "JPYIndex",
+    "5YrYield",
+    "10YrYield",
+    "Gold",
+    "Silver",
+    "Copper",
+    "CrudeOil",
+    "BrentCrudeOil",
+    "Gasoline",
+    "NaturalGas",
+    "Wheat",
+    "Corn",
+    "LiveCattle",
+    "Cotton",
+    "Sugar",
+    "Coffee",
+    "Cocoa",
+    "OrangeJuice",
+]
+
+futures_symbols = [
+    "DX=F",
+    "6E=F",
+    "6J=F",
+    "^FVX",
+    "^TNX",
+    "GC=F",
+    "SI=F",
+    "HG=F",
+    "CL=F",
+    "BZ=F",
+    "RB=F",
+    "NG=F",
+    "ZW=F",
+    "ZC=F",
+    "LE=F",
+    "CT=F",
+    "SB=F",
+    "KC=F",
+    "CC=F",
+    "OJ=F",
+]
+
+futures_contracts = dict(zip(futures_underlying, futures_symbols))
+
+# Every raw series we download: (key, source, symbol, name).
+# Nested all_data entries use "group/member" keys, e.g. "caseshiller/Chicago".
+RAW_SERIES = [
+    ("SP500", "yahoo", "^GSPC", "S&P500"),
+    ("gold", "yahoo", "GC=F", "Gold"),
+    ("ShillerPE10", "multpl", "shiller-pe", "Shiller P/E 10"),
+    ("equity", "fred", "NCBEILQ027S", "Nonfinancial Corporate Business; Corporate Equities; Liability, Level"),
+    ("networth", "fred", "TNWMVBSNNCB", "Nonfinancial Corporate Business; Net Worth, Level"),
+    ("cpi", "fred", "CPIAUCSL", "CPI"),
+    ("cpi_food", "fred", "CPIUFDSL", "CPI: Food"),
+    ("cpi_housing", "fred", "CPIHOSSL", "CPI: Housing"),
+    ("cpi_medical", "fred", "CPIMEDSL", "CPI: Medical"),
+    ("cpi_education", "fred", "CUSR0000SAE1", "CPI: Education"),
+    ("gdpdef", "fred", "GDPDEF", "GDP Deflator"),
+    ("MB", "fred", "BOGMBASE", "Monetary Base"),  # in millions
+    ("M2", "fred", "M2SL", "M2"),  # in billions
+    ("treasury_yield1mo", "fred", "DGS1MO", "Treasury 1 mo"),
+    ("treasury_yield2mo", "fred", "DGS2MO", "Treasury 2 mo"),
+    ("treasury_yield4mo", "fred", "DGS4MO", "Treasury 4 mo"),
+    ("treasury_yield6mo", "fred", "DGS6MO", "Treasury 6 mo"),
+    ("treasury_yield1", "fred", "DGS1", "Treasury 1 yr"),
+    ("treasury_yield2", "fred", "DGS2", "Treasury 2 yr"),
+    ("treasury_yield3", "fred", "DGS3", "Treasury 3 yr"),
+    ("treasury_yield5", "fred", "DGS5", "Treasury 5 yr"),
+    ("treasury_yield7", "fred", "DGS7", "Treasury 7 yr"),
+    ("treasury_yield10", "fred", "DGS10", "Treasury 10 yr"),
+    ("treasury_yield20", "fred", "DGS20", "Treasury 20 yr"),
+    ("treasury_yield30", "fred", "DGS30", "Treasury 30 yr"),
+    ("GDP", "fred", "GDP", "GDP"),  # Billions of dollars
+    ("RealGDP", "fred", "GDPC1", "Real GDP"),  # Billions of Chained 2012 Dollars
+    # TED spread is discontinued as LIBOR is gone in 2021
+    # use SOFR-T-bill spread instead
+    # Keep TED spread for historical reference
+    ("tedspread", "fred", "TEDRATE", "TED Spread"),
+    ("SOFR", "fred", "SOFR", "SOFR"),
+    ("t3m", "fred", "DGS3MO", "3-month T-bill"),
+    ("vix", "yahoo", "^VIX", "VIX"),
+    ("stl_fsi", "fred", "STLFSI4", "St. Louis Fed Financial Stress Index"),
+    ("kc_fsi", "fred", "KCFSI", "Kansas City Financial Stress Index"),
+    ("c_fsi", "fred", "CFSI", "Cleveland Financial Stress Index"),  # discontinued
+    ("anfci", "fred", "ANFCI", "Chicago Fed Adjusted National Financial Conditions Index"),
+    ("population", "fred", "POP", "US Population"),
+    ("wa_population_raw", "fred", "LFWA64TTUSM647N", "Working age population (age 15-64)"),
+    ("pop_white", "fred", "LNU00000003", "White population"),
+    ("pop_black", "fred", "LNU00000006", "Black population"),
+    ("pop_hispanic", "fred", "LNU00000009", "Hispanic population"),
+    ("pop_asian", "fred", "LNU00032183", "Asian population"),
+    ("epr", "fred", "EMRATIO", "Civilian Employment-Population ratio"),
+    ("uer", "fred", "UNRATE", "Civilian Unemployment Rate"),
+    ("lfpr", "fred", "CIVPART", "Civilian Labor Force Participation Rate"),
+]
+RAW_SERIES += [
+    (f"caseshiller/{city}", "fred", series_id, f"Case Shiller Index: {city}")
+    for city, series_id in CaseShillerIndexID.items()
+]
+RAW_SERIES += [
+    (f"futures/{comdty}", "yahoo", futures_contracts[comdty], f"Futures: {comdty}")
+    for comdty in futures_underlying
+]
+
+SOURCE_LABELS = {"fred": "Fred", "yahoo": "Yahoo", "multpl": "Multpl"}
+
+# Request rate (per second), burst and maximum requests in flight per source,
+# with retries and backoff (see rate_limit.py). FRED allows 120 requests a
+# minute; yf.download calls are serialized by _yahoo_lock anyway. The
+# counters of each provider's summary are reset by every run_pipeline.
+PROVIDERS = {
+    "fred": Provider("Fred", rate=2.0, burst=10, max_concurrency=8),
+    "yahoo": Provider("Yahoo", rate=2.0, burst=5, max_concurrency=2, serialize=_yahoo_lock),
+    "multpl": Provider("Multpl", rate=0.5, burst=1, max_concurrency=1),
+}
+
+
+def fetch_series(source, symbol, name, date_start, date_end, cached=None):
+    """
+    Download one raw series from its source. Returns DataFrame with columns:
+    date, value
+
+    cached is the last checkpoint of the series; sources that can update
+    incrementally only fetch what is newer than it. Requests go through the
+    source's entry in PROVIDERS.
+    """
+    if source == "fred":
+        return PROVIDERS[source].call(get_daily_data_from_fred, symbol, date_start, date_end, name)
+    if source == "yahoo":
+        return PROVIDERS[source].call(get_daily_data_from_yahoo, symbol, date_start, date_end, name)
+    if source == "multpl":
+        return PROVIDERS[source].call(get_shiller_pe_from_multpl, cached, table=symbol)
+    raise ValueError(f"Unknown data source {source}")
+
+
 # --------------------------------------------------
-# Download section
+# Derived series
 # --------------------------------------------------
+# DERIVED maps each derived all_data key to (inputs, calc), where calc takes
+# a dict holding at least the inputs. Entries are in dependency order.
+# derived_for(cfg) adds the entries that depend on the config.
 
-isdownloaded = False
-pickle_fn = "MarketBigPictureWatch.pkl"
+def _binary(a, operator, b, scale=None):
+    def calc(d):
+        df = calc_two_dataframes(d[a], operator, d[b])
+        if scale is not None:
+            df["value"] = df["value"] * scale
+        return df
+    return [a, b], calc
 
-if os.path.isfile(pickle_fn) and date.today() == date.fromtimestamp(os.path.getmtime(pickle_fn)):
-    print("Fresh pickle found, loading data from it...")
-    with open(pickle_fn, "rb") as f:
-        all_data = pickle.load(f)
-        
-    isdownloaded = True
 
-if not isdownloaded:
-    print("Downloading data from Fred, Yahoo, and Multpl...\n")
+# Normalized to pre-2008 era (1982 to May 2008) which was pretty flat
+MB_GDP_NORM_PERIOD = (pd.Timestamp("1982-01-01"), pd.Timestamp("2008-05-01"))
 
-    # S&P 500 index
-    print("************** S&P500 (Yahoo) **************")
-    SP500 = get_daily_data_from_yahoo("^GSPC", date_plotstart, date_plotend, "SP500")
 
-    # Gold price
-    print("************** Gold (Yahoo) **************")
-    gold = get_daily_data_from_yahoo("GC=F", date_plotstart, date_plotend, "Gold")
+def _MB_GDP_norm_mean(d):
+    MB_GDP = d["MB_GDP"]
+    start, end = MB_GDP_NORM_PERIOD
+    mask_norm = (MB_GDP["date"] > start) & (MB_GDP["date"] < end)
+    return MB_GDP.loc[mask_norm, "value"].mean()
 
-    # S&P500 / Gold
-    SP500_gold = calc_two_dataframes(SP500, "/", gold)
-    
-        # Shiller P/E 10 ratio
-    print("\n************** Shiller P/E 10 (Multpl) **************")
-    ShillerPE10 = get_shiller_pe_from_multpl()
 
-    # Tobin's Q ratio components
-    print("\n************** Nonfinancial Corporate Business; Corporate Equities; Liability, Level (Fred) **************")
-    equity = get_daily_data_from_fred("NCBEILQ027S", date_plotstart, date_plotend, "Equity")
+def _calc_MB_GDP_norm(d, mean=None):
+    if mean is None:
+        mean = _MB_GDP_norm_mean(d)
+    MB_GDP_norm = d["MB_GDP"].copy()
+    MB_GDP_norm["value"] = MB_GDP_norm["value"] / mean
+    return MB_GDP_norm
 
-    print("\n************** Nonfinancial Corporate Business; Net Worth, Level (Fred) **************")
-    networth = get_daily_data_from_fred("TNWMVBSNNCB", date_plotstart, date_plotend, "NetWorth")
-    
-    TobinQ = calc_two_dataframes(equity, "/", networth)
 
-    # Inflation - CPI and components
-    print("\n************** CPI (Fred) **************")
-    cpi = get_daily_data_from_fred("CPIAUCSL", date_plotstart, date_plotend, "CPI")
+def _calc_wa_population(d):
+    wa_population = d["wa_population_raw"].copy()
+    wa_population["value"] = wa_population["value"] / 1000.0
+    return wa_population
 
-    print("\n************** CPI: Food (Fred) **************")
-    cpi_food = get_daily_data_from_fred("CPIUFDSL", date_plotstart, date_plotend, "CPI Food")
 
-    print("\n************** CPI: Housing (Fred) **************")
-    cpi_housing = get_daily_data_from_fred("CPIHOSSL", date_plotstart, date_plotend, "CPI Housing")
+# Constant-maturity Treasury yields making up the curve, by tenor label
+TREASURY_CURVE_KEYS = {
+    "1M": "treasury_yield1mo",
+    "2M": "treasury_yield2mo",
+    "3M": "t3m",
+    "4M": "treasury_yield4mo",
+    "6M": "treasury_yield6mo",
+    "1Y": "treasury_yield1",
+    "2Y": "treasury_yield2",
+    "3Y": "treasury_yield3",
+    "5Y": "treasury_yield5",
+    "7Y": "treasury_yield7",
+    "10Y": "treasury_yield10",
+    "20Y": "treasury_yield20",
+    "30Y": "treasury_yield30",
+}
 
-    print("\n************** CPI: Medical (Fred) **************")
-    cpi_medical = get_daily_data_from_fred("CPIMEDSL", date_plotstart, date_plotend, "CPI Medical")
 
-    print("\n************** CPI: Education (Fred) **************")
-    cpi_education = get_daily_data_from_fred("CUSR0000SAE1", date_plotstart, date_plotend, "CPI Education")
-    print("\n************** GDP Deflator (Fred) **************")
-    gdpdef = get_daily_data_from_fred("GDPDEF", date_plotstart, date_plotend, "GDP Deflator")
+def _calc_treasury_curve(d):
+    return build_curve({label: d[key] for label, key in TREASURY_CURVE_KEYS.items()})
 
-    SP500_gdpdef = calc_two_dataframes(SP500, "/", gdpdef)
 
-    # Money supply
-    print("\n************** Monetary Base (Fred) **************")
-    MB = get_daily_data_from_fred("BOGMBASE", date_plotstart, date_plotend, "Monetary Base") # in millions 
+def _curve_spread(short, long):
+    # long minus short tenor yield, e.g. _curve_spread("2Y", "10Y") for 2s10s
+    return ["treasury_curve"], lambda d: curve_spread(d["treasury_curve"], short, long)
 
-    print("\n************** M2 (Fred) **************")
-    M2 = get_daily_data_from_fred("M2SL", date_plotstart, date_plotend, "M2") # in billions
 
-    SP500_M2 = calc_two_dataframes(SP500, "/", M2)
+def _calc_relative_value_logprices(d):
+    series = dict(d["futures_prices"])
+    series["SP500"] = d["SP500"]
+    series["VIX"] = d["vix"]
+    return log_price_matrix(series)
 
-    print("\n************** US Treasury Zero-Coupon Yield Curve (FRED) **************")
-    treasury_yield1 = get_daily_data_from_fred("DGS1", date_plotstart, date_plotend, "Treasury 1 yr")
-    treasury_yield2 = get_daily_data_from_fred("DGS2", date_plotstart, date_plotend, "Treasury 2 yr")
-    treasury_yield5 = get_daily_data_from_fred("DGS5", date_plotstart, date_plotend, "Treasury 5 yr")
-    treasury_yield10 = get_daily_data_from_fred("DGS10", date_plotstart, date_plotend, "Treasury 10 yr")
-    treasury_yield20 = get_daily_data_from_fred("DGS20", date_plotstart, date_plotend, "Treasury 20 yr")
-  
-    # short term interest rate (1 Yr) / long term interest rate (20 Yr)
-    treasury_yield_spread = calc_two_dataframes(treasury_yield1, "/", treasury_yield20)
 
-    # GDP
-    print("\n************** GDP (Fred) **************")
-    GDP = get_daily_data_from_fred("GDP", date_plotstart, date_plotend, "GDP") # Billions of dollars
+def _group(prefix, members):
+    # folds "prefix/member" raw keys into a dict of DataFrames
+    inputs = [f"{prefix}/{m}" for m in members]
+    return inputs, lambda d: {m: d[k] for m, k in zip(members, inputs)}
 
-    print("\n************** Real GDP (Fred) **************")
-    RealGDP = get_daily_data_from_fred("GDPC1", date_plotstart, date_plotend, "Real GDP") # Billions of Chained 2012 Dollars
 
-    SP500_gdp = calc_two_dataframes(SP500, "/", GDP)
+DERIVED = {
+    "SP500_gold": _binary("SP500", "/", "gold"),
+    # Tobin's Q ratio
+    "TobinQ": _binary("equity", "/", "networth"),
+    "SP500_gdpdef": _binary("SP500", "/", "gdpdef"),
+    "SP500_M2": _binary("SP500", "/", "M2"),
+    # short term interest rate (1 Yr) / long term interest rate (20 Yr)
+    "treasury_yield_spread": _binary("treasury_yield1", "/", "treasury_yield20"),
+    "SP500_gdp": _binary("SP500", "/", "GDP"),
+    "GDP_deflated": _binary("GDP", "/", "gdpdef", scale=100.0),
+    "SP500_deflgdp": _binary("SP500", "/", "GDP_deflated"),
+    # Excess Monetary Base Explansion: MB / GDP
+    "MB_GDP": _binary("MB", "/", "GDP"),
+    "M2_GDP": _binary("M2", "/", "GDP"),
+    "MB_GDP_norm": (["MB_GDP"], _calc_MB_GDP_norm),
+    # Adjust treasury yield spread using excess monetary base expansion
+    "treasury_yield_spread_adj": _binary("treasury_yield_spread", "*", "MB_GDP_norm"),
+    "SOFR_t3m": _binary("SOFR", "-", "t3m"),
+    # date x tenor yield matrix, gaps filled across tenors (see yield_curve.py)
+    "treasury_curve": (list(TREASURY_CURVE_KEYS.values()), _calc_treasury_curve),
+    "treasury_spread_2s10s": _curve_spread("2Y", "10Y"),
+    "treasury_spread_3m10y": _curve_spread("3M", "10Y"),
+    "wa_population": (["wa_population_raw"], _calc_wa_population),
+    "ratio_white": _binary("pop_white", "/", "population"),
+    "ratio_black": _binary("pop_black", "/", "population"),
+    "ratio_hispanic": _binary("pop_hispanic", "/", "population"),
+    "ratio_asian": _binary("pop_asian", "/", "population"),
+    "gdp_per_capita": _binary("GDP", "/", "population", scale=1e6 / 1e3),
+    "realgdp_per_capita": _binary("RealGDP", "/", "population", scale=1e6 / 1e3),
+    "futures_prices": _group("futures", futures_underlying),
+    "futures_underlying": ([], lambda d: futures_underlying),
+    # aligned log prices of the futures, S&P500 and VIX, and the current
+    # z-score and 3-month return spread of every pair (see relative_value.py;
+    # relative_value.pair_series gives the history of any one pair)
+    "relative_value_logprices": (
+        ["futures_prices", "SP500", "vix"], _calc_relative_value_logprices
+    ),
+    "relative_value_zscores": (
+        ["relative_value_logprices"], lambda d: zscore_matrix(d["relative_value_logprices"])
+    ),
+    "relative_value_spreads": (
+        ["relative_value_logprices"],
+        lambda d: return_spread_matrix(d["relative_value_logprices"]),
+    ),
+}
+
+# Derived series whose row at a date only depends on the input rows at that
+# date (with MB_GDP_norm's mean over MB_GDP_NORM_PERIOD cached). They are
+# recomputed from the first new or revised input date on, from the state in
+# derived_cache (persisted in the checkpoint directory), so a refresh does
+# not redo the whole history.
+ROW_LOCAL_SERIES = {
+    key: None
+    for key in [
+        "SP500_gold",
+        "TobinQ",
+        "SP500_gdpdef",
+        "SP500_M2",
+        "treasury_yield_spread",
+        "SP500_gdp",
+        "GDP_deflated",
+        "SP500_deflgdp",
+        "MB_GDP",
+        "M2_GDP",
+        "treasury_yield_spread_adj",
+        "SOFR_t3m",
+        "treasury_curve",
+        "treasury_spread_2s10s",
+        "treasury_spread_3m10y",
+        "wa_population",
+        "ratio_white",
+        "ratio_black",
+        "ratio_hispanic",
+        "ratio_asian",
+        "gdp_per_capita",
+        "realgdp_per_capita",
+    ]
+}
+ROW_LOCAL_SERIES["MB_GDP_norm"] = (_MB_GDP_norm_mean, MB_GDP_NORM_PERIOD[1])
+derived_cache = DerivedCache()
+for _key, _constant in ROW_LOCAL_SERIES.items():
+    _inputs, _calc = DERIVED[_key]
+    DERIVED[_key] = (_inputs, lambda d, k=_key, i=_inputs, c=_calc, const=_constant: (
+        derived_cache.rowwise(k, {name: d[name] for name in i}, c, const)
+    ))
+
+# Historical percentile rank and rolling z-score of the valuation, rate
+# structure and stress series, as "<key>_pctrank" and "<key>_zscore". They
+# are updated incrementally from the state in online_stats (persisted in the
+# checkpoint directory), so a refresh only processes the new observations.
+STATS_SERIES = [
+    "ShillerPE10",
+    "TobinQ",
+    "SP500_gold",
+    "SP500_gdpdef",
+    "SP500_M2",
+    "SP500_gdp",
+    "SP500_deflgdp",
+    "treasury_yield_spread",
+    "stl_fsi",
+    "kc_fsi",
+    "c_fsi",
+    "anfci",
+]
+online_stats = OnlineStats()
+for _key in STATS_SERIES:
+    DERIVED[f"{_key}_pctrank"] = ([_key], lambda d, k=_key: online_stats.pctrank(k, d[k]))
+    DERIVED[f"{_key}_zscore"] = ([_key], lambda d, k=_key: online_stats.zscore(k, d[k]))
 
-    GDP_deflated = calc_two_dataframes(GDP, "/", gdpdef)
-    GDP_deflated["value"] = GDP_deflated["value"] * 100.0
+# Derived series whose value at a date only depends on their inputs at that
+# date or before, and not on where their history starts, so the full series
+# cut to a date range is what it would be if computed over that range. The
+# others (a normalization over a fixed period, the percentile ranks and
+# z-scores over the history so far, the relative value matrices as of the
+# last row) are recomputed from the cut inputs when a figure is rendered
+# over another date range than the one loaded (see asof_data).
+CAUSAL_DERIVED = (
+    {key for key, constant in ROW_LOCAL_SERIES.items() if constant is None}
+    | {"futures_prices", "futures_underlying", "caseshiller"}
+)
 
-    SP500_deflgdp = calc_two_dataframes(SP500, "/", GDP_deflated)
 
-    # Excess Monetary Base Explansion: MB / GDP
-    MB_GDP = calc_two_dataframes(MB, "/", GDP)
-    M2_GDP = calc_two_dataframes(M2, "/", GDP)
+def derived_for(cfg):
+    derived = dict(DERIVED)
+    derived["caseshiller"] = _group("caseshiller", cfg["cities_of_interest"])
+    return derived
 
-    # Normalized to pre-2008 era (1982 to May 2008) which was pretty flat
-    mask_norm = (MB_GDP["date"] > pd.Timestamp("1982-01-01")) & (
-        MB_GDP["date"] < pd.Timestamp("2008-05-01")
-    )
-    MB_GDP_norm = MB_GDP.copy()
-    MB_GDP_norm["value"] = MB_GDP["value"] / MB_GDP.loc[mask_norm, "value"].mean()
 
-    # Adjust treasury yield spread using excess monetary base expansion
-    treasury_yield_spread_adj = calc_two_dataframes(
-        treasury_yield_spread, "*", MB_GDP_norm
-    )
+def all_series_keys(cfg):
+    """All keys that can be requested with the "series" config entry."""
+    return [spec[0] for spec in RAW_SERIES] + list(derived_for(cfg))
 
-    # TED spread is discontinued as LIBOR is gone in 2021
-    # use SOFR-T-bill spread instead
-    # Keep TED spread for historical reference
-    print("\n************** TED Spread (Fred) **************")
-    tedspread = get_daily_data_from_fred("TEDRATE", date_plotstart, date_plotend, "TED Spread")
-    print("\n************** SOFR (Fred) **************")
-    SOFR = get_daily_data_from_fred("SOFR", date_plotstart, date_plotend, "SOFR")
-    print("\n************** 3-month T-bill (Fred) **************")
-    t3m = get_daily_data_from_fred("DGS3MO", date_plotstart, date_plotend, "3-month T-bill")
 
-    SOFR_t3m = calc_two_dataframes(SOFR, "-", t3m)
+def raw_inputs(keys, derived):
+    """
+    Return the raw series keys (in RAW_SERIES order) that the given all_data
+    keys depend on.
+    """
+    needed = set()
+    stack = list(keys)
+    while stack:
+        key = stack.pop()
+        if key in derived:
+            stack.extend(derived[key][0])
+        else:
+            needed.add(key)
+    return [spec[0] for spec in RAW_SERIES if spec[0] in needed]
+
+
+def compute_derived(data, derived):
+    """
+    Add every derived series whose inputs are available to data (in place).
+    Returns the list of keys added.
+    """
+    added = []
+    for key, (inputs, calc) in derived.items():
+        if key not in data and all(k in data for k in inputs):
+            data[key] = calc(data)
+            added.append(key)
+    return added
 
-    # VIX
-    print("\n************** VIX (Yahoo) **************")
-    vix = get_daily_data_from_yahoo("^VIX", date_plotstart, date_plotend, "VIX")
 
-    # Financial stress indices
-    print("\n************** St. Louis Fed Financial Stress Index **************")
-    stl_fsi = get_daily_data_from_fred("STLFSI4", date_plotstart, date_plotend, "STLFSI4")
+# --------------------------------------------------
+# Checkpoints and run journal
+# --------------------------------------------------
+# Every raw series is pickled into checkpoint_dir as soon as it arrives, and
+# the journal records what happened to each series in today's run. A rerun
+# on the same day only fetches series that are missing or failed. A failed
+# series falls back to its last good checkpoint (possibly from an earlier
+# day), so the figures can still be rendered. Runs ending on a past date
+# read today's checkpoints but do not write any.
 
-    print("\n************** Kansas City Financial Stress Index **************")
-    kc_fsi = get_daily_data_from_fred("KCFSI", date_plotstart, date_plotend, "KCFSI")
+checkpoint_dir = "MarketBigPictureWatch_cache"
+journal_fn = os.path.join(checkpoint_dir, "journal.json")
 
-    print("\n************** Cleveland Financial Stress Index **************")
-    c_fsi = get_daily_data_from_fred("CFSI", date_plotstart, date_plotend, "CFSI") # discontinued
 
-    print("\n************** Chicago Fed Adjusted National Financial Conditions Index **************")
-    anfci = get_daily_data_from_fred("ANFCI", date_plotstart, date_plotend, "ANFCI")
+def _checkpoint_path(key):
+    return os.path.join(checkpoint_dir, key.replace("/", "__") + ".pkl")
 
-    # Population
-    print("\n************** US Population (Fred) **************")
-    population = get_daily_data_from_fred("POP", date_plotstart, date_plotend, "Population")
 
-    print("\n************** Working age population (age 15-64) (Fred) **************")
-    wa_population = get_daily_data_from_fred(
-        "LFWA64TTUSM647N", date_plotstart, date_plotend, "WorkingAgePop"
-    )
-    wa_population["value"] = wa_population["value"] / 1000.0
+def _atomic_write(path, write, mode="wb"):
+    tmp = path + ".tmp"
+    with open(tmp, mode) as f:
+        write(f)
+    os.replace(tmp, path)
 
-    print("\n************** White population (Fred) **************")
-    ratio_white = calc_two_dataframes(
-        get_daily_data_from_fred("LNU00000003", date_plotstart, date_plotend, "White"),
-        "/",
-        population,
-    )
 
-    print("\n************** Black population (Fred) **************")
-    ratio_black = calc_two_dataframes(
-        get_daily_data_from_fred("LNU00000006", date_plotstart, date_plotend, "Black"),
-        "/",
-        population,
-    )
+def load_checkpoint(key):
+    with open(_checkpoint_path(key), "rb") as f:
+        return pickle.load(f)
 
-    print("\n************** Hispanic population (Fred) **************")
-    ratio_hispanic = calc_two_dataframes(
-        get_daily_data_from_fred("LNU00000009", date_plotstart, date_plotend, "Hispanic"),
-        "/",
-        population,
-    )
 
-    print("\n************** Asian population (Fred) **************")
-    ratio_asian = calc_two_dataframes(
-        get_daily_data_from_fred("LNU00032183", date_plotstart, date_plotend, "Asian"),
-        "/",
-        population,
+def save_checkpoint(key, df):
+    _atomic_write(
+        _checkpoint_path(key),
+        lambda f: pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL),
     )
 
-    gdp_per_capita = calc_two_dataframes(GDP, "/", population)
-    gdp_per_capita["value"] = gdp_per_capita["value"] * (1e6 / 1e3)
-
-    realgdp_per_capita = calc_two_dataframes(RealGDP, "/", population)
-    realgdp_per_capita["value"] = realgdp_per_capita["value"] * (1e6 / 1e3)
-
-    # Labor market
-    print("\n************** Civilian Employment-Population ratio (Fred) **************")
-    epr = get_daily_data_from_fred("EMRATIO", date_plotstart, date_plotend, "EMRATIO")
-
-    print("\n************** Civilian Unemployment Rate (Fred) **************")
-    uer = get_daily_data_from_fred("UNRATE", date_plotstart, date_plotend, "UNRATE")
-
-    print("\n************** Civilian Labor Force Participation Rate (Fred) **************")
-    lfpr = get_daily_data_from_fred("CIVPART", date_plotstart, date_plotend, "CIVPART")
-
-    # Case-Shiller
-    CaseShillerIndexID = {
-        "City20": "SPCS20RSA",
-        "Chicago": "CHXRSA",
-        "SanFrancisco": "SFXRSA",
-        "LosAngeles": "LXXRSA",
-        "SanDiego": "SDXRSA",
-        "NewYork": "NYXRSA",
-        "Portland": "POXRSA",
-        "Seattle": "SEXRSA",
-        "Atlanta": "ATXRSA",
-        "Boston": "BOXRSA",
-        "Charlotte": "CRXRSA",
-        "Cleveland": "CEXRSA",
-        "Dallas": "DAXRSA",
-        "Denver": "DNXRSA",
-        "Detroit": "DEXRSA",
-        "LasVegas": "LVXRSA",
-        "Miami": "MIXRSA",
-        "Minneapolis": "MNXRSA",
-        "Phoenix": "PHXRSA",
-        "Tampa": "TPXRSA",
-        "WashingtonDC": "WDXRSA",
-        "City10": "SPCS10RSA",
-        "National": "CSUSHPISA",
-    }
-    caseshiller = {}
-    for city in cities_of_interest:
-        print(f"\n************** Case Shiller Index: {city} (Fred) **************")
-        caseshiller[city] = get_daily_data_from_fred(
-            CaseShillerIndexID[city], date_plotstart, date_plotend, f"CaseShiller {city}"
-        )
-
-    # Futures (Yahoo)
-    futures_underlying = [
-        "USDIndex",
-        "EURIndex",
-        "JPYIndex",
-        "5YrYield",
-        "10YrYield",
-        "Gold",
-        "Silver",
-        "Copper",
-        "CrudeOil",
-        "BrentCrudeOil",
-        "Gasoline",
-        "NaturalGas",
-        "Wheat",
-        "Corn",
-        "LiveCattle",
-        "Cotton",
-        "Sugar",
-        "Coffee",
-        "Cocoa",
-        "OrangeJuice",
-    ]
 
-    futures_symbols = [
-        "DX=F",
-        "6E=F",
-        "6J=F",
-        "^FVX",
-        "^TNX",
-        "GC=F",
-        "SI=F",
-        "HG=F",
-        "CL=F",
-        "BZ=F",
-        "RB=F",
-        "NG=F",
-        "ZW=F",
-        "ZC=F",
-        "LE=F",
-        "CT=F",
-        "SB=F",
-        "KC=F",
-        "CC=F",
-        "OJ=F",
-    ]
+def load_journal():
+    """
+    Return today's run journal, or a fresh one if the last run was on an
+    earlier day.
+    """
+    todaystr = date.today().strftime(date_fmt)
+    if os.path.isfile(journal_fn):
+        with open(journal_fn) as f:
+            journal = json.load(f)
+        if journal.get("run_date") == todaystr:
+            return journal
+    return {"run_date": todaystr, "series": {}}
 
-    futures_contracts = dict(zip(futures_underlying, futures_symbols))
-    futures_prices = {}
-    for comdty in futures_underlying:
-        print(f"\n************** Futures: {comdty} (Yahoo) **************")
-        futures_prices[comdty] = get_daily_data_from_yahoo(
-            futures_contracts[comdty], date_plotstart, date_plotend, comdty
-        )
 
-    print("\nAll downloads finished! Saving to pickle...")
-    
-    all_data = {
-        "SP500": SP500,
-        "gold": gold,
-        "SP500_gold": SP500_gold,
-        "ShillerPE10": ShillerPE10,
-        "equity": equity,
-        "networth": networth,
-        "TobinQ": TobinQ,
-        "cpi": cpi,
-        "cpi_food": cpi_food,
-        "cpi_housing": cpi_housing,
-        "cpi_medical": cpi_medical,
-        "cpi_education": cpi_education,
-        "gdpdef": gdpdef,
-        "SP500_gdpdef": SP500_gdpdef,
-        "MB": MB,
-        "M2": M2,
-        "SP500_M2": SP500_M2,
-        "treasury_yield1": treasury_yield1,
-        "treasury_yield2": treasury_yield2,
-        "treasury_yield5": treasury_yield5,
-        "treasury_yield10": treasury_yield10,
-        "treasury_yield20": treasury_yield20,
-        "treasury_yield_spread": treasury_yield_spread,
-        "treasury_yield_spread_adj": treasury_yield_spread_adj,
-        "GDP": GDP,
-        "RealGDP": RealGDP,
-        "SP500_gdp": SP500_gdp,
-        "GDP_deflated": GDP_deflated,
-        "SP500_deflgdp": SP500_deflgdp,
-        "MB_GDP": MB_GDP,
-        "M2_GDP": M2_GDP,
-        "tedspread": tedspread,
-        "SOFR_t3m": SOFR_t3m,
-        "vix": vix,
-        "stl_fsi": stl_fsi,
-        "kc_fsi": kc_fsi,
-        "c_fsi": c_fsi,
-        "anfci": anfci,
-        "population": population,
-        "wa_population": wa_population,
-        "ratio_white": ratio_white,
-        "ratio_black": ratio_black,
-        "ratio_hispanic": ratio_hispanic,
-        "ratio_asian": ratio_asian,
-        "gdp_per_capita": gdp_per_capita,
-        "realgdp_per_capita": realgdp_per_capita,
-        "epr": epr,
-        "uer": uer,
-        "lfpr": lfpr,
-        "caseshiller": caseshiller,       # dict of DataFrames
-        "futures_prices": futures_prices,  # dict of DataFrames
-        "futures_underlying": futures_underlying,
-    }
-    
-    # normalize all DataFrame dates to datetime64[ns]
-    for key, val in all_data.items():
-        if isinstance(val, pd.DataFrame) and "date" in val.columns:
-            all_data[key]["date"] = pd.to_datetime(all_data[key]["date"])
-        elif isinstance(val, dict):
-            # e.g. caseshiller, futures_prices
-            for k2, df2 in val.items():
-                if isinstance(df2, pd.DataFrame) and "date" in df2.columns:
-                    all_data[key][k2]["date"] = pd.to_datetime(df2["date"])   
-                    
-    with open(pickle_fn, "wb") as f:
-        pickle.dump(all_data, f, protocol=pickle.HIGHEST_PROTOCOL)
-        
-    isdownloaded = True
+def save_journal(journal):
+    _atomic_write(journal_fn, lambda f: json.dump(journal, f, indent=1), mode="w")
 
 
 # --------------------------------------------------
 # Plotting using all_data
 # --------------------------------------------------
+# Each plot_big_picture* function draws into the Figure it is given. Figures
+# use the object-oriented API on their own Agg canvas (no pyplot registry),
+# and render_figure() tears each one down right after saving it, so memory
+# stays flat no matter how many figures a process renders.
+
+def _rss_mb():
+    """Current resident set size in MB (the peak so far where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        if resource is None:
+            return float("nan")
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+class PeakRss:
+    """
+    Context manager that samples the RSS on a background thread. After the
+    block, start, peak and end hold the RSS in MB.
+    """
 
-if isdownloaded:
-    print("\nPlotting...")
-    nfig = 0
-    todaystr = date.today().strftime(date_fmt)
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss_mb())
+
+    def __enter__(self):
+        self.start = self.peak = _rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.end = _rss_mb()
+        self.peak = max(self.peak, self.end)
+
+
+def new_figure(cfg):
+    fig = Figure(facecolor="w", figsize=cfg["figsize"], dpi=cfg["dpi"])
+    FigureCanvasAgg(fig)
+    return fig
 
-    # ===========================
-    # First figure block
-    # ===========================
-    fig = plt.figure(facecolor="w", figsize=figsize, dpi=dpi)
+
+def close_figure(fig):
+    # break the figure/axes/artist reference cycles now rather than whenever
+    # the garbage collector gets to them
+    fig.clear()
+    gc.collect()
+
+
+def render_figure(name, plot, all_data, cfg, templates=None):
+    """
+    Render one figure to <output_dir>/<name>.png, tear it down and report the
+    time and peak RSS it took. Returns the PeakRss measurement. With
+    templates (a figure_templates.TemplateCache) the figure is redrawn from
+    its cached template when only its data and titles changed.
+    """
+    path = os.path.join(cfg["output_dir"], f"{name}.png")
+    t0 = time.perf_counter()
+    with PeakRss() as rss:
+        if templates is not None:
+            how = templates.render(name, plot, all_data, cfg, path)
+        else:
+            fig = new_figure(cfg)
+            try:
+                with profiling.stage("render"):
+                    plot(fig, all_data, cfg)
+                with profiling.stage("save"):
+                    fig.savefig(path)
+            finally:
+                close_figure(fig)
+                del fig
+    note = f" ({how})" if templates is not None else ""
+    print(
+        f"{name}{note}: {time.perf_counter() - t0:.1f} s, peak RSS {rss.peak:.0f} MB "
+        f"({rss.peak - rss.start:+.0f} MB), {rss.end:.0f} MB after teardown"
+    )
+    return rss
+
+
+# ===========================
+# First figure block
+# ===========================
+def plot_big_picture1(fig, all_data, cfg):
+    """Macro economy, inflation, money supply and valuation: BigPicture1.png"""
+    xlim_start, xlim_end = cfg["xlim_start"], cfg["xlim_end"]
+    todaystr, legend_fontsize = cfg["todaystr"], cfg["legend_fontsize"]
     nrows, ncols = 3, 2
     nplot = 0
 
     nplot += 1
-    ax = plt.subplot(nrows, ncols, nplot)
+    ax = fig.add_subplot(nrows, ncols, nplot)
     ax.plot(all_data["SP500"]["date"], all_data["SP500"]["value"], "b-", label="S&P500")
     ax.set_xlim([xlim_start, xlim_end])
     ax.legend(prop={"size": legend_fontsize}, loc="upper left")
@@ -569,21 +953,20 @@ if isdownloaded:
     ax2.set_xlim([xlim_start, xlim_end])
     ax2.legend(prop={"size": legend_fontsize}, loc="lower right")
     ax.grid(True, linestyle=":")
-    plt.title(f"Stock and Gold as of {todaystr}")
+    ax.set_title(f"Stock and Gold as of {todaystr}")
 
     nplot += 1
-    ax = plt.subplot(nrows, ncols, nplot)
+    ax = fig.add_subplot(nrows, ncols, nplot)
     ax.plot(all_data["SP500_gold"]["date"], all_data["SP500_gold"]["value"], "b-")
     ax.set_xlim([xlim_start, xlim_end])
     ax.grid(True, linestyle=":")
-    plt.title(f"S&P500 / Gold as of {todaystr}")
+    ax.set_title(f"S&P500 / Gold as of {todaystr}")
 
     nplot += 1
-    ax = plt.subplot(nrows, ncols, nplot)
-    baseline_yearsago = 10
-    baseline_year = date.today().year - baseline_yearsago
-    baseline_date_py = date(baseline_year, date.today().month, date.today().day)
-    baseline_date = pd.Timestamp(baseline_date_py)  # <-- convert to Timestamp to avoid comparison error to datetime64[ns]
+    ax = fig.add_subplot(nrows, ncols, nplot)
+    baseline_yearsago = cfg["inflation_baseline_yrs"]
+    # DateOffset moves Feb 29 to Feb 28 (month-end backtests have those)
+    baseline_date = pd.Timestamp(cfg["date_dataend"]) - pd.DateOffset(years=baseline_yearsago)
 
     baseline_cpi = all_data["cpi"].loc[
         all_data["cpi"]["date"] >= baseline_date, "value"
@@ -657,12 +1040,12 @@ if isdownloaded:
     ax.set_ylabel("Index")
     ax.legend(prop={"size": legend_fontsize}, loc="upper left")
     ax.grid(True, linestyle=":")
-    plt.title(
+    ax.set_title(
         f"Inflation Index ({baseline_yearsago} years ago = 100) as of {todaystr}"
     )
 
     nplot += 1
-    ax = plt.subplot(nrows, ncols, nplot)
+    ax = fig.add_subplot(nrows, ncols, nplot)
     ax.plot(
         all_data["SP500_gdp"]["date"],
         all_data["SP500_gdp"]["value"],
@@ -681,10 +1064,10 @@ if isdownloaded:
     ax2.set_xlim([xlim_start, xlim_end])
     ax2.legend(prop={"size": legend_fontsize}, loc="upper right")
     ax.grid(True, linestyle=":")
-    plt.title(f"S&P500 vs. GDP and M2 as of {todaystr}")
+    ax.set_title(f"S&P500 vs. GDP and M2 as of {todaystr}")
 
     nplot += 1
-    ax = plt.subplot(nrows, ncols, nplot)
+    ax = fig.add_subplot(nrows, ncols, nplot)
     ax.plot(all_data["MB"]["date"], all_data["MB"]["value"], "b-", label="MB")
     ax.plot(all_data["M2"]["date"], all_data["M2"]["value"], "r-", label="M2")
     ax.plot(all_data["GDP"]["date"], all_data["GDP"]["value"], "-", label="GDP")
@@ -714,10 +1097,10 @@ if isdownloaded:
     ax2.set_xlim([xlim_start, xlim_end])
     ax2.legend(prop={"size": legend_fontsize}, loc="upper center")
     ax.grid(True, linestyle=":")
-    plt.title(f"Money Supply and GDP as of {todaystr}")
+    ax.set_title(f"Money Supply and GDP as of {todaystr}")
 
     nplot += 1
-    ax = plt.subplot(nrows, ncols, nplot)
+    ax = fig.add_subplot(nrows, ncols, nplot)
     ax.plot(
         all_data["ShillerPE10"]["date"],
         all_data["ShillerPE10"]["value"],
@@ -736,21 +1119,23 @@ if isdownloaded:
     ax2.set_xlim([xlim_start, xlim_end])
     ax2.legend(prop={"size": legend_fontsize}, loc="upper right")
     ax.grid(True, linestyle=":")
-    plt.title(f"Stock Market Valuation - Ratios as of {todaystr}")
+    ax.set_title(f"Stock Market Valuation - Ratios as of {todaystr}")
+
+    fig.tight_layout()
 
-    plt.tight_layout()
-    nfig += 1
-    plt.savefig(os.path.join(PIC_DIR, f"BigPicture{nfig}.png"))
 
-    # ===========================
-    # Second figure block
-    # ===========================
-    plt.figure(facecolor="w", figsize=figsize, dpi=dpi)
+# ===========================
+# Second figure block
+# ===========================
+def plot_big_picture2(fig, all_data, cfg):
+    """Interest rates and financial stress: BigPicture2.png"""
+    xlim_start, xlim_end = cfg["xlim_start"], cfg["xlim_end"]
+    todaystr, legend_fontsize = cfg["todaystr"], cfg["legend_fontsize"]
     nrows, ncols = 3, 2
     nplot = 0
 
     nplot += 1
-    ax = plt.subplot(nrows, ncols, nplot)
+    ax = fig.add_subplot(nrows, ncols, nplot)
     ax.plot(
         all_data["treasury_yield20"]["date"],
         all_data["treasury_yield20"]["value"],
@@ -795,10 +1180,10 @@ if isdownloaded:
     ax.set_ylabel("%")
     ax.legend(prop={"size": legend_fontsize}, loc="upper left")
     ax.grid(True, linestyle=":")
-    plt.title(f"Treasury Zero-Coupon Yield as of {todaystr}")
+    ax.set_title(f"Treasury Zero-Coupon Yield as of {todaystr}")
 
     nplot += 1
-    ax = plt.subplot(nrows, ncols, nplot)
+    ax = fig.add_subplot(nrows, ncols, nplot)
     ax.plot(
         all_data["SP500"]["date"],
         all_data["SP500"]["value"],
@@ -826,16 +1211,14 @@ if isdownloaded:
         label="1Yr/15Yr_MBAdj",
     )
     # horizontal line at 1
-    first_date = all_data["treasury_yield_spread"]["date"].iloc[0]
-    last_date = all_data["treasury_yield_spread"]["date"].iloc[-1]
-    ax2.plot([first_date, last_date], [1, 1], "-", color="red")
+    ax2.axhline(1, color="red")
     ax2.set_xlim([xlim_start, xlim_end])
     ax2.legend(prop={"size": legend_fontsize}, loc="upper center")
     ax.grid(True, linestyle=":")
-    plt.title(f"Stock Market and Interest Rate Structure as of {todaystr}")
+    ax.set_title(f"Stock Market and Interest Rate Structure as of {todaystr}")
 
     nplot += 1
-    ax = plt.subplot(nrows, ncols, nplot)
+    ax = fig.add_subplot(nrows, ncols, nplot)
     ax.plot(
         all_data["vix"]["date"],
         all_data["vix"]["value"],
@@ -866,10 +1249,10 @@ if isdownloaded:
     ax2.set_ylabel("%")
     ax2.legend(prop={"size": legend_fontsize}, loc="upper right")
     ax.grid(True, linestyle=":")
-    plt.title(f"Financial Stress Indicators (1) as of {todaystr}")
+    ax.set_title(f"Financial Stress Indicators (1) as of {todaystr}")
 
     nplot += 1
-    ax = plt.subplot(nrows, ncols, nplot)
+    ax = fig.add_subplot(nrows, ncols, nplot)
     ax.plot(
         all_data["SP500"]["date"],
         all_data["SP500"]["value"],
@@ -899,12 +1282,12 @@ if isdownloaded:
     ax2.set_xlim([xlim_start, xlim_end])
     ax2.legend(prop={"size": legend_fontsize}, loc="upper center")
     ax.grid(True, linestyle=":")
-    plt.title(f"Financial Stress Indicators (2) as of {todaystr}")
+    ax.set_title(f"Financial Stress Indicators (2) as of {todaystr}")
 
     ## this correlation plot has no meaning now -it seems SOFR-T-bill spread is leading VIX, not
     ## correlating
     # nplot += 1
-    # ax = plt.subplot(nrows, ncols, nplot)
+    # ax = fig.add_subplot(nrows, ncols, nplot)
     # SOFR_t3m_vix = pd.merge(
     #     all_data["SOFR_t3m"],
     #     all_data["vix"],
@@ -917,10 +1300,10 @@ if isdownloaded:
     # ax.set_ylabel("SOFR-T-bill Spread")
     # corr = SOFR_t3m_vix["value_1"].corr(SOFR_t3m_vix["value"])
     # ax.grid(True, linestyle=":")
-    # plt.title(f"VIX ~ SOFR-T-bill Spread, corr = {round(corr * 100, 2)}%")
+    # ax.set_title(f"VIX ~ SOFR-T-bill Spread, corr = {round(corr * 100, 2)}%")
 
     nplot += 1
-    ax = plt.subplot(nrows, ncols, nplot)
+    ax = fig.add_subplot(nrows, ncols, nplot)
     ax.plot(
         all_data["SP500"]["date"],
         all_data["SP500"]["value"],
@@ -950,22 +1333,24 @@ if isdownloaded:
     ax2.set_xlim([xlim_start, xlim_end])
     ax2.legend(prop={"size": legend_fontsize}, loc="upper center")
     ax.grid(True, linestyle=":")
-    plt.title(f"Financial Stress Indicators (3) as of {todaystr}")
+    ax.set_title(f"Financial Stress Indicators (3) as of {todaystr}")
 
-    plt.tight_layout()
-    nfig += 1
-    plt.savefig(os.path.join(PIC_DIR, f"BigPicture{nfig}.png"))
+    fig.tight_layout()
 
-    # ===========================
-    # Third figure block
-    # ===========================
-    plt.figure(facecolor="w", figsize=figsize, dpi=dpi)
+
+# ===========================
+# Third figure block
+# ===========================
+def plot_big_picture3(fig, all_data, cfg):
+    """Population, labor market and home prices: BigPicture3.png"""
+    xlim_start, xlim_end = cfg["xlim_start"], cfg["xlim_end"]
+    todaystr, legend_fontsize = cfg["todaystr"], cfg["legend_fontsize"]
 
     nrows, ncols = 2, 2
     nplot = 0
 
     nplot += 1
-    ax = plt.subplot(nrows, ncols, nplot)
+    ax = fig.add_subplot(nrows, ncols, nplot)
     ax.plot(
         all_data["population"]["date"],
         all_data["population"]["value"] / 1e6,
@@ -1006,10 +1391,10 @@ if isdownloaded:
     ax2.set_xlim([xlim_start, xlim_end])
     ax2.legend(prop={"size": legend_fontsize}, loc="lower right")
     ax.grid(True, linestyle=":")
-    plt.title(f"Population as of {todaystr}")
+    ax.set_title(f"Population as of {todaystr}")
 
     nplot += 1
-    ax = plt.subplot(nrows, ncols, nplot)
+    ax = fig.add_subplot(nrows, ncols, nplot)
     ax.plot(
         all_data["epr"]["date"],
         all_data["epr"]["value"],
@@ -1042,11 +1427,11 @@ if isdownloaded:
     ax2.set_ylabel("%")
     ax2.legend(prop={"size": legend_fontsize}, loc="upper center")
     ax.grid(True, linestyle=":")
-    plt.title(f"Labor Market Condition as of {todaystr}")
+    ax.set_title(f"Labor Market Condition as of {todaystr}")
 
     nplot += 1
-    ax = plt.subplot(nrows, ncols, nplot)
-    for n, city in enumerate(cities_of_interest):
+    ax = fig.add_subplot(nrows, ncols, nplot)
+    for n, city in enumerate(cfg["cities_of_interest"]):
         city_df = all_data["caseshiller"][city]
         ax.plot(
             city_df["date"],
@@ -1059,24 +1444,31 @@ if isdownloaded:
     ax.set_xlim([xlim_start, xlim_end])
     ax.legend(prop={"size": legend_fontsize}, loc="upper left")
     ax.grid(True, linestyle=":")
-    plt.title(f"S&P/Case-Shiller Home Price Indices as of {todaystr}")
+    ax.set_title(f"S&P/Case-Shiller Home Price Indices as of {todaystr}")
+
+    fig.tight_layout()
+
 
-    plt.tight_layout()
-    nfig += 1
-    plt.savefig(os.path.join(PIC_DIR, f"BigPicture{nfig}.png"))
+# ===========================
+# Fourth figure block: Futures long term
+# ===========================
+def futures_grid(n):
+    """(nrows, ncols) of the futures figures for n contracts: 4 x 5 for 20."""
+    ncols = max(1, min(n, math.ceil(math.sqrt(n * 5 / 4))))
+    return math.ceil(n / ncols), ncols
 
-    # ===========================
-    # Fourth figure block: Futures long term
-    # ===========================
-    plt.figure(facecolor="w", figsize=figsize, dpi=dpi)
 
-    nrows, ncols = 4, 5
+def plot_big_picture4(fig, all_data, cfg):
+    """Futures, long term: BigPicture4.png"""
+    xlim_end, todaystr = cfg["xlim_end"], cfg["todaystr"]
+
+    nrows, ncols = futures_grid(len(all_data["futures_underlying"]))
     nplot = 0
 
-    future_long_start = pd.Timestamp(date_future_plotstart_long)
+    future_long_start = pd.Timestamp(cfg["date_future_plotstart_long"])
     for comdty in all_data["futures_underlying"]:
         nplot += 1
-        ax = plt.subplot(nrows, ncols, nplot)
+        ax = fig.add_subplot(nrows, ncols, nplot)
         df_fut = all_data["futures_prices"][comdty]
         ax.plot(
             df_fut["date"],
@@ -1088,26 +1480,26 @@ if isdownloaded:
         )
         ax.set_xlim([future_long_start, xlim_end])
         ax.legend()
-        plt.grid(True, linestyle=":")
-        plt.tick_params(axis="both", which="major", labelsize=6)
-        plt.tick_params(axis="both", which="minor", labelsize=6)
-    plt.suptitle(f"Futures - Long Term ({future_yrs_long}-year) as of {todaystr}")
-    nfig += 1
-    plt.savefig(os.path.join(PIC_DIR, f"BigPicture{nfig}.png"))
-        
-
-    # ===========================
-    # Fourth figure block: Futures short term
-    # ===========================
-    plt.figure(facecolor="w", figsize=figsize, dpi=dpi)
-
-    nrows, ncols = 4, 5
+        ax.grid(True, linestyle=":")
+        ax.tick_params(axis="both", which="major", labelsize=6)
+        ax.tick_params(axis="both", which="minor", labelsize=6)
+    fig.suptitle(f"Futures - Long Term ({cfg['future_yrs_long']}-year) as of {todaystr}")
+
+
+# ===========================
+# Fifth figure block: Futures short term
+# ===========================
+def plot_big_picture5(fig, all_data, cfg):
+    """Futures, short term: BigPicture5.png"""
+    xlim_end, todaystr = cfg["xlim_end"], cfg["todaystr"]
+
+    nrows, ncols = futures_grid(len(all_data["futures_underlying"]))
     nplot = 0
 
-    future_short_start = pd.Timestamp(date_future_plotstart_short)
+    future_short_start = pd.Timestamp(cfg["date_future_plotstart_short"])
     for comdty in all_data["futures_underlying"]:
         nplot += 1
-        ax = plt.subplot(nrows, ncols, nplot)
+        ax = fig.add_subplot(nrows, ncols, nplot)
         df_fut = all_data["futures_prices"][comdty]
         df_fut = df_fut[df_fut["date"] >= future_short_start]
         df_fut = df_fut[df_fut["date"] <= xlim_end]
@@ -1121,12 +1513,820 @@ if isdownloaded:
         )
         # ax.set_xlim([future_short_start, xlim_end])
         ax.legend()
-        plt.grid(True, linestyle=":")
-        plt.tick_params(axis="both", which="major", labelsize=5)
-        plt.tick_params(axis="both", which="minor", labelsize=5)  
-    plt.suptitle(f"Futures - Short Term ({future_yrs_short}-year) as of {todaystr}")
-    nfig += 1
-    plt.savefig(os.path.join(PIC_DIR, f"BigPicture{nfig}.png"))
-
-    print(f"All done! Browse the folder '{PIC_DIR}' for the plots.")
-    
+        ax.grid(True, linestyle=":")
+        ax.tick_params(axis="both", which="major", labelsize=5)
+        ax.tick_params(axis="both", which="minor", labelsize=5)
+    fig.suptitle(f"Futures - Short Term ({cfg['future_yrs_short']}-year) as of {todaystr}")
+
+
+# ===========================
+# Sixth figure block: Valuation and stress statistics
+# ===========================
+VALUATION_STATS_LINES = [
+    ("ShillerPE10", "Shiller P/E 10", "blue"),
+    ("TobinQ", "Tobin's Q", "red"),
+    ("SP500_gdp", "S&P500 / GDP", "green"),
+    ("SP500_M2", "S&P500 / M2", "magenta"),
+    ("SP500_gold", "S&P500 / Gold", "orange"),
+]
+STRESS_STATS_LINES = [
+    ("treasury_yield_spread", "1Yr/20Yr Yield", "magenta"),
+    ("stl_fsi", "St. Louis Fed FSI", "red"),
+    ("kc_fsi", "Kansas City FSI", "green"),
+    ("anfci", "Chicago Fed Adjusted National FCI", "blue"),
+    ("c_fsi", "Cleveland FSI (discontinued)", "gray"),
+]
+
+
+def plot_big_picture6(fig, all_data, cfg):
+    """Valuation and stress percentile ranks and z-scores: BigPicture6.png"""
+    xlim_start, xlim_end = cfg["xlim_start"], cfg["xlim_end"]
+    todaystr, legend_fontsize = cfg["todaystr"], cfg["legend_fontsize"]
+    nrows, ncols = 2, 2
+    nplot = 0
+
+    for lines, what in [
+        (VALUATION_STATS_LINES, "Stock Market Valuation"),
+        (STRESS_STATS_LINES, "Rate Structure and Financial Stress"),
+    ]:
+        nplot += 1
+        ax = fig.add_subplot(nrows, ncols, nplot)
+        for key, label, color in lines:
+            df = all_data[f"{key}_pctrank"]
+            ax.plot(df["date"], df["value"], "-", color=color, linewidth=1, label=label)
+        for level in [10, 90]:
+            ax.axhline(level, color="black", linestyle="--", linewidth=0.5)
+        ax.set_xlim([xlim_start, xlim_end])
+        ax.set_ylim([0, 100])
+        ax.set_ylabel("Percentile")
+        ax.legend(prop={"size": legend_fontsize}, loc="lower left")
+        ax.grid(True, linestyle=":")
+        ax.set_title(f"{what} - Historical Percentile Rank as of {todaystr}")
+
+        nplot += 1
+        ax = fig.add_subplot(nrows, ncols, nplot)
+        for key, label, color in lines:
+            df = all_data[f"{key}_zscore"]
+            ax.plot(df["date"], df["value"], "-", color=color, linewidth=1, label=label)
+        for level in [-2, 2]:
+            ax.axhline(level, color="black", linestyle="--", linewidth=0.5)
+        ax.set_xlim([xlim_start, xlim_end])
+        ax.set_ylabel("Z-score")
+        ax.legend(prop={"size": legend_fontsize}, loc="lower left")
+        ax.grid(True, linestyle=":")
+        ax.set_title(f"{what} - 10-year Rolling Z-score as of {todaystr}")
+
+    fig.tight_layout()
+
+
+# ===========================
+# Seventh figure block: Treasury yield curve
+# ===========================
+CURVE_SNAPSHOT_YEARS = [(0, "black"), (1, "blue"), (2, "green"), (5, "orange")]
+
+
+def plot_big_picture7(fig, all_data, cfg):
+    """Treasury yield curve surface, snapshots and spreads: BigPicture7.png"""
+    xlim_start, xlim_end = cfg["xlim_start"], cfg["xlim_end"]
+    todaystr, legend_fontsize = cfg["todaystr"], cfg["legend_fontsize"]
+    curve = all_data["treasury_curve"]
+    tenor_labels = [label for label, t in TENORS if label in curve.columns]
+    tenor_years = [t for label, t in TENORS if label in curve.columns]
+
+    # Surface: weekly curves on a log-spaced maturity grid
+    ax = fig.add_subplot(2, 1, 1)
+    weekly = (
+        curve[curve["date"] >= xlim_start]
+        .set_index("date").resample("W").last().dropna().reset_index()
+    )
+    grid = np.geomspace(tenor_years[0], tenor_years[-1], 64)
+    mesh = ax.pcolormesh(
+        weekly["date"], grid, interpolate_curve(weekly, grid).T,
+        shading="nearest", cmap="viridis",
+    )
+    fig.colorbar(mesh, ax=ax, label="Yield (%)", pad=0.01)
+    ax.set_yscale("log")
+    ax.set_yticks(tenor_years)
+    ax.set_yticklabels(tenor_labels)
+    ax.minorticks_off()
+    ax.set_xlim([xlim_start, xlim_end])
+    ax.set_ylabel("Maturity")
+    ax.set_title(f"Treasury Yield Curve as of {todaystr}")
+
+    # Curve snapshots
+    ax = fig.add_subplot(2, 2, 3)
+    dates = curve["date"].to_numpy()
+    values = curve[tenor_labels].to_numpy()
+    for years, color in CURVE_SNAPSHOT_YEARS:
+        target = dates[-1] - np.timedelta64(365 * years, "D")
+        i = np.searchsorted(dates, target, side="right") - 1
+        if i < 0:
+            continue
+        ax.plot(
+            tenor_years, values[i], ".-", color=color, linewidth=1,
+            label=pd.Timestamp(dates[i]).strftime("%Y-%m-%d"),
+        )
+    ax.set_xscale("log")
+    ax.set_xticks(tenor_years)
+    ax.set_xticklabels(tenor_labels)
+    ax.minorticks_off()
+    ax.set_ylabel("Yield (%)")
+    ax.legend(prop={"size": legend_fontsize}, loc="lower right")
+    ax.grid(True, linestyle=":")
+    ax.set_title("Treasury Yield Curve Snapshots")
+
+    # Spreads
+    ax = fig.add_subplot(2, 2, 4)
+    for key, label, color in [
+        ("treasury_spread_2s10s", "10 Yr - 2 Yr", "blue"),
+        ("treasury_spread_3m10y", "10 Yr - 3 Mo", "red"),
+    ]:
+        df = all_data[key]
+        ax.plot(df["date"], df["value"], "-", color=color, linewidth=1, label=label)
+    ax.axhline(0, color="black", linestyle="--", linewidth=0.5)
+    ax.set_xlim([xlim_start, xlim_end])
+    ax.set_ylabel("Spread (%)")
+    ax.legend(prop={"size": legend_fontsize}, loc="lower left")
+    ax.grid(True, linestyle=":")
+    ax.set_title(f"Treasury Yield Curve Spreads as of {todaystr}")
+
+    fig.tight_layout()
+
+
+# ===========================
+# Eighth figure block: Cross-asset relative value
+# ===========================
+def plot_big_picture8(fig, all_data, cfg):
+    """Cross-asset relative value z-scores and return spreads: BigPicture8.png"""
+    todaystr = cfg["todaystr"]
+    for nplot, (key, title, limit, label) in enumerate([
+        ("relative_value_zscores", "Price Ratio Z-score (1-year)", 3, "Z-score of row / column"),
+        ("relative_value_spreads", "Return Spread (3-month)", None, "Row minus column return (%)"),
+    ], start=1):
+        ax = fig.add_subplot(1, 2, nplot)
+        matrix = all_data[key]
+        if limit is None:
+            limit = np.nanpercentile(np.abs(matrix.to_numpy()), 95)
+        image = ax.imshow(matrix.to_numpy(), cmap="RdBu_r", vmin=-limit, vmax=limit)
+        fig.colorbar(image, ax=ax, label=label, shrink=0.8)
+        ax.set_xticks(range(len(matrix.columns)))
+        ax.set_xticklabels(matrix.columns, rotation=90, fontsize=7)
+        ax.set_yticks(range(len(matrix.index)))
+        ax.set_yticklabels(matrix.index, fontsize=7)
+        ax.set_title(f"Cross-Asset {title} as of {todaystr}")
+    fig.tight_layout()
+
+
+# Figures in the order they are produced: (name, plot function, all_data inputs)
+FIGURES = [
+    ("BigPicture1", plot_big_picture1, [
+        "SP500", "gold", "SP500_gold", "cpi", "cpi_food", "cpi_housing", "cpi_medical",
+        "cpi_education", "gdpdef", "SP500_gdp", "SP500_M2", "MB", "M2", "GDP", "RealGDP",
+        "MB_GDP", "M2_GDP", "ShillerPE10", "TobinQ",
+    ]),
+    ("BigPicture2", plot_big_picture2, [
+        "treasury_yield1", "treasury_yield2", "treasury_yield5", "treasury_yield10",
+        "treasury_yield20", "SP500", "treasury_yield_spread", "treasury_yield_spread_adj",
+        "vix", "tedspread", "SOFR_t3m", "stl_fsi", "kc_fsi", "c_fsi", "anfci",
+    ]),
+    ("BigPicture3", plot_big_picture3, [
+        "population", "wa_population", "gdp_per_capita", "realgdp_per_capita",
+        "epr", "lfpr", "uer", "caseshiller",
+    ]),
+    ("BigPicture4", plot_big_picture4, ["futures_prices", "futures_underlying"]),
+    ("BigPicture5", plot_big_picture5, ["futures_prices", "futures_underlying"]),
+    ("BigPicture6", plot_big_picture6, [
+        f"{key}_{stat}"
+        for key, label, color in VALUATION_STATS_LINES + STRESS_STATS_LINES
+        for stat in ["pctrank", "zscore"]
+    ]),
+    ("BigPicture7", plot_big_picture7, [
+        "treasury_curve", "treasury_spread_2s10s", "treasury_spread_3m10y",
+    ]),
+    ("BigPicture8", plot_big_picture8, ["relative_value_zscores", "relative_value_spreads"]),
+]
+
+
+# --------------------------------------------------
+# Download/plot pipeline
+# --------------------------------------------------
+
+def _fetch_to_checkpoint(key, source, symbol, name, date_start, date_end, store=None, checkpoint=True):
+    print(f"\n************** {name} ({SOURCE_LABELS[source]}) **************")
+    cached = None
+    if source == "multpl" and os.path.isfile(_checkpoint_path(key)):
+        cached = load_checkpoint(key)
+    df = fetch_series(source, symbol, name, date_start, date_end, cached)
+    df["date"] = pd.to_datetime(df["date"])
+    with profiling.stage("save"):
+        if checkpoint:
+            save_checkpoint(key, df)
+        if store is not None:
+            store.commit(key, df)
+    return df
+
+
+def run_pipeline(journal, cfg):
+    """
+    Fetch the raw series behind the figures and series selected in cfg on a
+    thread pool, and render each figure on this thread as soon as its own
+    inputs are ready, so downloading and plotting overlap. Only the raw series
+    the selection depends on are fetched; checkpoints from today's journal
+    that cover the requested date range are reused, and new downloads are
+    checkpointed and recorded in the vintage store, unless the end date is
+    in the past. With cfg["vintage_asof"] set, the series are read from the
+    vintage store as known on that date instead (journal is not used).
+    Returns all_data, every series cut to the requested date range.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    for provider in PROVIDERS.values():
+        provider.reset()
+    specs = {spec[0]: spec for spec in RAW_SERIES}
+    derived = derived_for(cfg)
+    figures = [f for f in FIGURES if f[0] in cfg["figures"]]
+    date_start, date_end = cfg["date_plotstart"], cfg["date_plotend"]
+    start_str, end_str = date_start.strftime(date_fmt), date_end.strftime(date_fmt)
+
+    # fetch in the order the figures need the series, then the extra series
+    order = []
+    for name, plot, inputs in figures:
+        order += [k for k in raw_inputs(inputs, derived) if k not in order]
+    order += [k for k in raw_inputs(cfg["series"], derived) if k not in order]
+
+    all_data = {}
+    pending = list(figures)
+    missing = []
+
+    def in_range(key, df):
+        # a download may reach outside the range (the whole multpl table), and
+        # so may a checkpoint (today's, for a past end date) or a vintage
+        return slice_data({key: df}, date_start, date_end)[key]
+
+    def advance():
+        with profiling.stage("derive"):
+            compute_derived(all_data, derived)
+        for fig_spec in list(pending):
+            name, plot, inputs = fig_spec
+            if all(k in all_data for k in inputs):
+                print(f"\nPlotting {name}...")
+                render_figure(name, plot, all_data, cfg)
+                pending.remove(fig_spec)
+
+    store = VintageStore(cfg["vintage_dir"]) if cfg["vintage_dir"] else None
+    persist = True
+    if cfg["vintage_asof"]:
+        for key in order:
+            df = store.read(key, cfg["vintage_asof"])
+            if df is None:
+                missing.append(key)
+            else:
+                all_data[key] = in_range(key, df)
+        advance()
+        order = []
+    elif date_end != date.today():
+        # a past end date is not today's view of the series: its downloads
+        # do not replace today's checkpoints, journal or vintages
+        store = None
+        persist = False
+
+    with ThreadPoolExecutor(max_workers=cfg["fetch_workers"]) as pool:
+        tasks = {}
+        for key in order:
+            entry = journal["series"].get(key, {})
+            if (
+                entry.get("status") == "ok"
+                and entry.get("start", start_str) <= start_str
+                and entry.get("end", end_str) >= end_str
+                and os.path.isfile(_checkpoint_path(key))
+            ):
+                all_data[key] = in_range(key, load_checkpoint(key))
+            else:
+                task = pool.submit(
+                    _fetch_to_checkpoint, *specs[key], date_start, date_end, store, persist
+                )
+                tasks[task] = key
+        advance()
+
+        for task in as_completed(tasks):
+            key = tasks[task]
+            now = datetime.now().isoformat(timespec="seconds")
+            try:
+                all_data[key] = in_range(key, task.result())
+                journal["series"][key] = {
+                    "status": "ok", "time": now, "start": start_str, "end": end_str
+                }
+            except Exception as exc:
+                name = specs[key][3]
+                print(f"!!! Failed to fetch {name}: {exc!r}")
+                entry = {"status": "failed", "time": now, "error": repr(exc)}
+                if os.path.isfile(_checkpoint_path(key)):
+                    all_data[key] = in_range(key, load_checkpoint(key))
+                    entry["fallback"] = date.fromtimestamp(
+                        os.path.getmtime(_checkpoint_path(key))
+                    ).strftime(date_fmt)
+                    print(f"    Using cached copy from {entry['fallback']}")
+                else:
+                    missing.append(key)
+                journal["series"][key] = entry
+            if persist:
+                save_journal(journal)
+            advance()
+
+    for provider in PROVIDERS.values():
+        if provider.requests:
+            print(provider.summary())
+
+    if missing and cfg["vintage_asof"]:
+        raise RuntimeError(
+            f"No vintage as of {cfg['vintage_asof']} for {', '.join(missing)}"
+        )
+    if missing:
+        raise RuntimeError(
+            f"No data and no cached copy for {', '.join(missing)}, so "
+            f"{', '.join(f[0] for f in pending) or 'some series'} could not be made; "
+            "rerun to retry only the failed series."
+        )
+    return {k: v for k, v in all_data.items() if "/" not in k}
+
+
+# --------------------------------------------------
+# Batch of dashboard variants
+# --------------------------------------------------
+# A batch is {variant name: config overrides}, applied on top of the base
+# config. The union of what the variants need is loaded once (over the
+# widest date range and all their cities) and every variant is rendered
+# from that shared data in a process pool, one task per figure and group
+# of variants with the same axes. Each variant gets the data cut to its own
+# date range, with the derived series that depend on the range (e.g.
+# MB_GDP_norm, the ranks and z-scores) recomputed over it (asof_data), so
+# it shows what a run of that variant alone would. The variants only
+# differ in how they are rendered: what is downloaded and from where
+# (vintage_asof, vintage_dir, fetch_workers, ...) comes from the base
+# config.
+
+def batch_configs(overrides, variants):
+    """
+    Return (load_cfg, {variant name: cfg}). Each variant's pictures go to
+    <output_dir>/<variant name> unless it sets its own output_dir.
+    """
+    base_dir = overrides.get("output_dir", DEFAULT_CONFIG["output_dir"])
+    cfgs = {}
+    for name, variant in variants.items():
+        if variant.get("vintage_asof", overrides.get("vintage_asof")) != overrides.get("vintage_asof"):
+            raise ValueError(f"Variant {name} cannot set vintage_asof; set it for the batch")
+        cfgs[name] = make_config(
+            {**overrides, "output_dir": os.path.join(base_dir, name), **variant}
+        )
+
+    keys, cities = [], []
+    for cfg in cfgs.values():
+        for fig_name, plot, inputs in FIGURES:
+            if fig_name in cfg["figures"]:
+                keys += inputs
+        keys += cfg["series"]
+        cities += cfg["cities_of_interest"]
+    load_cfg = make_config(dict(
+        overrides, figures=[], series=list(dict.fromkeys(keys)), cities_of_interest=[]
+    ))
+    # the union of the cities may be more than one figure can plot
+    load_cfg["cities_of_interest"] = list(dict.fromkeys(cities))
+    load_cfg["date_plotstart"] = min(cfg["date_plotstart"] for cfg in cfgs.values())
+    load_cfg["date_plotend"] = max(cfg["date_plotend"] for cfg in cfgs.values())
+    return load_cfg, cfgs
+
+
+def slice_data(all_data, date_start, date_end):
+    """
+    all_data restricted to [date_start, date_end], so that a variant's axes
+    autoscale to its own date range rather than to the shared one (a
+    date_start of None keeps the whole history). Series sorted by date are
+    sliced by position, which does not copy them.
+    """
+    start = pd.Timestamp(date_start) if date_start is not None else None
+    end = pd.Timestamp(date_end)
+
+    def cut(val):
+        if isinstance(val, pd.DataFrame) and "date" in val.columns:
+            dates = val["date"]
+            if dates.is_monotonic_increasing:
+                i = dates.searchsorted(start, side="left") if start is not None else 0
+                j = dates.searchsorted(end, side="right")
+                return val.iloc[i:j]
+            if start is None:
+                return val[dates <= end]
+            return val[(dates >= start) & (dates <= end)]
+        if isinstance(val, dict):
+            return {k: cut(v) for k, v in val.items()}
+        return val
+
+    return {key: cut(val) for key, val in all_data.items()}
+
+
+def _lookahead_keys(keys, derived):
+    """The derived keys among keys and their inputs that are not causal."""
+    lookahead = {}
+
+    def visit(key):
+        if key not in lookahead:
+            lookahead[key] = False
+            if key in derived:
+                inputs = [visit(k) for k in derived[key][0]]
+                lookahead[key] = key not in CAUSAL_DERIVED or any(inputs)
+        return lookahead[key]
+
+    for key in keys:
+        visit(key)
+    return {key for key, value in lookahead.items() if value}
+
+
+def asof_data(all_data, cfg, keys):
+    """
+    all_data as the figure inputs keys would have been on cfg["date_dataend"]:
+    the series restricted to [date_plotstart, date_dataend], with the derived
+    series that are not causal (see CAUSAL_DERIVED) recomputed from the
+    inputs in that range rather than cut, as a run over that range alone
+    would compute them.
+    """
+    derived = derived_for(cfg)
+    redo = _lookahead_keys(keys, derived)
+    data = slice_data(all_data, cfg["date_plotstart"], cfg["date_dataend"])
+    if redo:
+        for key in redo:
+            data.pop(key, None)
+        compute_derived(data, {k: v for k, v in derived.items() if k in redo})
+    return data
+
+
+# in a render_batch worker process: all_data as views of the shared block
+# published by the parent, and the figure templates of this worker
+_batch_data = None
+_batch_shm = None
+_batch_templates = None
+
+
+def _init_batch_worker(shm_name, manifest):
+    global _batch_data, _batch_shm, _batch_templates
+    _batch_data, _batch_shm = attach_shared(shm_name, manifest)
+    _batch_templates = TemplateCache(new_figure, close_figure)
+
+
+def _render_batch_figures(name, variants):
+    """
+    Render figure name for each (variant, cfg) of variants in turn, reusing
+    its template. Returns the [(variant, error)] that failed.
+    """
+    plot, inputs = {f[0]: (f[1], f[2]) for f in FIGURES}[name]
+    failed = []
+    for variant, cfg in variants:
+        try:
+            data = asof_data(_batch_data, cfg, inputs)
+            render_figure(name, plot, data, cfg, _batch_templates)
+        except Exception as exc:
+            failed.append((variant, repr(exc)))
+    return failed
+
+
+def render_batch(all_data, cfgs, workers=None):
+    """
+    Render the figures of every variant config in cfgs in a process pool.
+    all_data is published once to shared memory (see shm_store.py) rather
+    than pickled into every worker. Variants with the same axes (date_plotend
+    and figure size) are rendered one after the other by one worker, so that
+    they share its figure templates (see figure_templates.py).
+    """
+    groups = {}
+    for variant, cfg in sorted(cfgs.items(), key=lambda item: item[1]["date_dataend"]):
+        for name, plot, inputs in FIGURES:
+            if name in cfg["figures"]:
+                key = (name, cfg["date_plotend"], cfg["figsize"], cfg["dpi"])
+                groups.setdefault(key, []).append((variant, cfg))
+    for cfg in cfgs.values():
+        os.makedirs(cfg["output_dir"], exist_ok=True)
+
+    failed = []
+    with SharedSeriesStore(all_data) as store, ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_batch_worker,
+        initargs=(store.name, store.manifest),
+    ) as pool:
+        futures = {
+            pool.submit(_render_batch_figures, key[0], variants): (key[0], variants)
+            for key, variants in groups.items()
+        }
+        for future in as_completed(futures):
+            name, variants = futures[future]
+            try:
+                errors = dict(future.result())
+            except Exception as exc:
+                errors = {variant: repr(exc) for variant, cfg in variants}
+            for variant, cfg in variants:
+                if variant in errors:
+                    print(f"!!! [{variant}] {name} failed: {errors[variant]}")
+                    failed.append(f"{variant}/{name}")
+                else:
+                    print(f"[{variant}] {name} done")
+    if failed:
+        raise RuntimeError(f"Could not render {', '.join(failed)}")
+
+
+# --------------------------------------------------
+# Backtest: the dashboards as of many past dates
+# --------------------------------------------------
+# A backtest is a batch with one variant per date, rendered into
+# <output_dir>/backtest/<date>. The data are loaded once and every variant
+# shows them cut at its date (asof_data). With the "year" frame, the axes of
+# a date run to the end of its year, so all the dates of a year share one
+# layout and are redrawn from one figure template; the "date" frame ends the
+# axes at the date itself, as the dashboard looked then.
+
+BACKTEST_EVERY = {
+    "month": pd.offsets.MonthEnd(),
+    "quarter": pd.offsets.QuarterEnd(),
+    "year": pd.offsets.YearEnd(),
+}
+BACKTEST_FRAMES = ["date", "year"]
+
+
+def backtest_dates(start, end=None, every="month"):
+    """The month (quarter, year) ends from start to end (default: today)."""
+    end = end or date.today()
+    return [d.date() for d in pd.date_range(start, end, freq=BACKTEST_EVERY[every])]
+
+
+def backtest_configs(overrides, dates, frame="date"):
+    """Return (load_cfg, {date string: cfg}) for a backtest over dates."""
+    base_dir = os.path.join(overrides.get("output_dir", DEFAULT_CONFIG["output_dir"]), "backtest")
+    variants = {}
+    for d in dates:
+        axes_end = date(d.year, 12, 31) if frame == "year" else d
+        variants[d.isoformat()] = {
+            "date_plotend": axes_end.strftime(date_fmt),
+            "output_dir": os.path.join(base_dir, d.isoformat()),
+        }
+    load_cfg, cfgs = batch_configs(overrides, variants)
+    for d, cfg in zip(dates, cfgs.values()):
+        cfg["date_dataend"] = d
+        cfg["todaystr"] = d.strftime(date_fmt)
+    load_cfg["date_plotend"] = min(max(dates), date.today())
+    return load_cfg, cfgs
+
+
+def _raw_series(all_data, key):
+    # "group/member" raw keys are folded into all_data[group][member]
+    if "/" in key:
+        group, member = key.split("/", 1)
+        group = {"futures": "futures_prices"}.get(group, group)
+        return all_data.get(group, {}).get(member)
+    return all_data.get(key)
+
+
+def render_backtest_vintages(all_data, load_cfg, cfgs):
+    """
+    Render a backtest with every raw series as recorded in the vintage store
+    on each date (so before later revisions), rather than cut from today's
+    data. A date before the first vintage of a series gets that first
+    vintage; series the store does not have come from all_data. The dates
+    that see the same vintages are rendered as one batch.
+    """
+    global online_stats, derived_cache
+
+    if not load_cfg["vintage_dir"]:
+        raise ValueError("A backtest on vintages needs a vintage_dir")
+    store = VintageStore(load_cfg["vintage_dir"])
+    derived = derived_for(load_cfg)
+    keys = raw_inputs(load_cfg["series"], derived)
+    vintages = {key: store.vintages(key) for key in keys}
+
+    groups = {}
+    for variant, cfg in cfgs.items():
+        asof = cfg["date_dataend"].isoformat()
+        seen = tuple(
+            max(bisect.bisect_right(vintages[key], asof), 1) if vintages[key] else 0
+            for key in keys
+        )
+        groups.setdefault(seen, {})[variant] = cfg
+    print(f"{len(cfgs)} dates see {len(groups)} different sets of vintages.")
+
+    # the stateful derived series get in-memory state, so the persisted
+    # state of today's data is left alone; it carries over from one set of
+    # vintages to the next, whose revised rows it recomputes
+    online_stats, derived_cache = OnlineStats(), DerivedCache()
+    reads = {}
+    for seen, group_cfgs in groups.items():
+        data = {}
+        for key, n in zip(keys, seen):
+            if n:
+                if (key, n) not in reads:
+                    reads[key, n] = store.read(key, vintages[key][n - 1])
+                data[key] = reads[key, n]
+            elif _raw_series(all_data, key) is not None:
+                data[key] = _raw_series(all_data, key)
+        compute_derived(data, derived)
+        data = {k: v for k, v in data.items() if "/" not in k}
+        render_batch(data, group_cfgs, load_cfg["render_workers"])
+
+
+# --------------------------------------------------
+# Command line
+# --------------------------------------------------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Download key economic and market data from Fred, Yahoo and "
+        "Multpl, and plot the big pictures. Only the series needed for the "
+        "selected figures and series are downloaded.",
+    )
+    parser.add_argument("--config", help="JSON file with DEFAULT_CONFIG overrides")
+    parser.add_argument(
+        "--figures", nargs="*", metavar="FIG",
+        help="figures to plot, e.g. BigPicture2 or just 2 (default: all; "
+        "none if only --series is given)",
+    )
+    parser.add_argument(
+        "--series", nargs="+", metavar="KEY",
+        help="all_data keys to download/derive in addition to the figures' inputs "
+        "(default: a few extra ratios; none if only --figures is given)",
+    )
+    parser.add_argument("--macro-years", type=float, dest="macro_yrs_ultralong")
+    parser.add_argument("--futures-years-long", type=float, dest="future_yrs_long")
+    parser.add_argument("--futures-years-short", type=float, dest="future_yrs_short")
+    parser.add_argument("--end-date", dest="date_plotend", metavar="YYYY-MM-DD")
+    parser.add_argument("--cities", nargs="+", dest="cities_of_interest", metavar="CITY")
+    parser.add_argument("--output-dir", help="directory for the pictures")
+    parser.add_argument(
+        "--export-tiles", dest="tiles_dir", metavar="DIR",
+        help="also export the series as multi-resolution JSON tiles",
+    )
+    parser.add_argument(
+        "--as-of", dest="vintage_asof", metavar="YYYY-MM-DD",
+        help="plot the data as known on this date, from the vintage store",
+    )
+    parser.add_argument(
+        "--profile", dest="profile_dir", metavar="DIR",
+        help="profile the fetch/parse/derive/render/save stages into DIR",
+    )
+    parser.add_argument(
+        "--alerts", dest="alert_rules", metavar="RULES.json",
+        help="evaluate these alert rules over the new observations",
+    )
+    parser.add_argument(
+        "--alert-log", dest="alert_log", metavar="FILE",
+        help="also append the alerts to this file (JSON lines)",
+    )
+    parser.add_argument("--workers", type=int, dest="fetch_workers", help="concurrent downloads")
+    parser.add_argument(
+        "--batch", metavar="VARIANTS.json",
+        help="render every variant in this JSON file ({name: config overrides}) "
+        "from one shared data load",
+    )
+    parser.add_argument(
+        "--render-workers", type=int, dest="render_workers",
+        help="processes rendering --batch variants (default: one per core)",
+    )
+    parser.add_argument(
+        "--backtest", nargs="+", metavar="YYYY-MM-DD",
+        help="FROM [TO]: render the dashboards as of every month end from FROM "
+        "to TO (default: today) into <output-dir>/backtest/<date>, from one data load",
+    )
+    parser.add_argument(
+        "--backtest-every", choices=list(BACKTEST_EVERY), default="month",
+        help="backtest dates: month, quarter or year ends",
+    )
+    parser.add_argument(
+        "--backtest-frame", choices=BACKTEST_FRAMES, default="date",
+        help="axes of a backtest date run to the date itself, or to the end of "
+        "its year (and are shared by the year's dates)",
+    )
+    parser.add_argument(
+        "--backtest-vintages", action="store_true",
+        help="backtest on the series as recorded in the vintage store on each date",
+    )
+    parser.add_argument("--quiet", action="store_false", dest="isverbose", default=None)
+    parser.add_argument(
+        "--list", action="store_true", help="list figures and series keys, then exit"
+    )
+    args = parser.parse_args(argv)
+    if args.backtest and len(args.backtest) > 2:
+        parser.error("--backtest takes FROM and optionally TO")
+    if args.backtest and (args.batch or args.vintage_asof):
+        parser.error("--backtest cannot be combined with --batch or --as-of")
+    return args
+
+
+def overrides_from_args(args):
+    overrides = {}
+    if args.config:
+        with open(args.config) as f:
+            overrides.update(json.load(f))
+    for key in DEFAULT_CONFIG:
+        value = getattr(args, key, None)
+        if value is not None:
+            overrides[key] = value
+    # picking only figures (or only series) means nothing else is wanted
+    if "series" in overrides and "figures" not in overrides:
+        overrides["figures"] = []
+    if "figures" in overrides and "series" not in overrides:
+        overrides["series"] = []
+    return overrides
+
+
+def config_from_args(args):
+    return make_config(overrides_from_args(args))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    variant_cfgs = None
+    if args.batch:
+        with open(args.batch) as f:
+            cfg, variant_cfgs = batch_configs(overrides_from_args(args), json.load(f))
+    elif args.backtest:
+        dates = backtest_dates(*args.backtest, every=args.backtest_every)
+        if not dates:
+            raise ValueError(f"No {args.backtest_every} ends in {' to '.join(args.backtest)}")
+        cfg, variant_cfgs = backtest_configs(overrides_from_args(args), dates, args.backtest_frame)
+    else:
+        cfg = config_from_args(args)
+    if args.list:
+        for name, plot, inputs in FIGURES:
+            print(f"{name}: {plot.__doc__}")
+        print("\nSeries:", " ".join(all_series_keys(cfg)))
+        return
+
+    if cfg["profile_dir"]:
+        profiling.start(cfg["profile_dir"])
+    try:
+        run(cfg, variant_cfgs, args.backtest_vintages)
+    finally:
+        if cfg["profile_dir"]:
+            print("\n" + profiling.stop())
+            print(f"Profiles and flame graph stacks written to '{cfg['profile_dir']}'.")
+
+
+def run(cfg, variant_cfgs=None, backtest_vintages=False):
+    """
+    Load the data and render the figures of cfg (or of each variant; a
+    backtest's from the vintage store with backtest_vintages).
+    """
+    global isverbose, online_stats, derived_cache
+
+    isverbose = cfg["isverbose"]
+    if not variant_cfgs:
+        os.makedirs(cfg["output_dir"], exist_ok=True)
+
+    if cfg["vintage_asof"]:
+        print(f"Loading data as of {cfg['vintage_asof']} from the vintage store...\n")
+        all_data = run_pipeline(None, cfg)
+    else:
+        if cfg["date_plotend"] == date.today():
+            online_stats = OnlineStats(os.path.join(checkpoint_dir, "online_stats.pkl"))
+            derived_cache = DerivedCache(os.path.join(checkpoint_dir, "derived_cache.pkl"))
+        else:
+            # the state of a past end date is not kept, so today's is left alone
+            online_stats, derived_cache = OnlineStats(), DerivedCache()
+
+        print("Downloading data from Fred, Yahoo, and Multpl while plotting...\n")
+        journal = load_journal()
+        all_data = run_pipeline(journal, cfg)
+        online_stats.save()
+        derived_cache.save()
+
+        if cfg["alerts"] and cfg["date_plotend"] != date.today():
+            print("\nAlerts are only evaluated on runs ending today.")
+        elif cfg["alerts"]:
+            engine = AlertEngine(cfg["alerts"], os.path.join(checkpoint_dir, "alert_state.json"))
+            alerts = engine.evaluate(all_data)
+            print(f"\n{len(alerts)} new alert(s) from {len(cfg['alerts'])} rules.")
+            emit(alerts, cfg["alert_log"])
+            engine.save()
+
+        failed = [k for k, v in journal["series"].items() if v["status"] != "ok"]
+        if failed:
+            print(f"\nDownloads finished, using cached copies for: {', '.join(failed)}")
+        else:
+            print("\nAll downloads finished!")
+
+    if cfg["tiles_dir"]:
+        nwritten = export_tiles(all_data, cfg["tiles_dir"])
+        print(f"Exported tiles to '{cfg['tiles_dir']}' ({nwritten} files changed).")
+
+    if variant_cfgs:
+        print(f"\nRendering {len(variant_cfgs)} variants...")
+        if backtest_vintages:
+            render_backtest_vintages(all_data, cfg, variant_cfgs)
+        else:
+            render_batch(all_data, variant_cfgs, cfg["render_workers"])
+        print("All done! The plots are in:")
+        shown = list(variant_cfgs.items())
+        if len(shown) > 10:
+            shown = shown[:3] + [("...", None)] + shown[-3:]
+        for name, variant_cfg in shown:
+            print(f"    {name}: '{variant_cfg['output_dir']}'" if variant_cfg else "    ...")
+    elif cfg["figures"]:
+        print(f"All done! Browse the folder '{cfg['output_dir']}' for the plots.")
+    else:
+        print(f"All done! The series are checkpointed in '{checkpoint_dir}'.")
+
+
+if __name__ == "__main__":
+    main()
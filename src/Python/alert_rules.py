@@ -0,0 +1,197 @@
+# alert_rules.py
+"""
+Declarative alert rules evaluated over the all_data series after each refresh.
+
+A rules file is a JSON list of rules such as
+
+    {"name": "VIX spike", "series": "vix", "type": "change_above",
+     "level": 50, "periods": 5}
+
+- name      unique name of the rule (its state is kept under it)
+- series    an all_data key, or "group/member" for nested entries
+            (e.g. "caseshiller/Chicago", "futures_prices/Gold")
+- type      cross_above / cross_below: the value crosses level
+            zscore_above / zscore_below: the z-score of the value against
+                the trailing "window" observations crosses level
+            change_above / change_below: the percent change over "periods"
+                observations crosses level
+- level     the threshold
+
+Rules are edge-triggered: an alert fires on the observation where the
+condition becomes true, not on every observation while it stays true.
+
+Evaluation is incremental. The date of the last observation evaluated is
+kept per rule (a run on a past end date does not move it back), and a
+refresh only evaluates the observations added since then (plus the window
+or periods of lookback the rule needs), so the cost per run does not depend
+on the length of the history. A rule seen for the first time (or whose
+definition changed) only evaluates the latest observation.
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+def _cross(x, rule):
+    return x, x
+
+
+def _zscore(x, rule):
+    window = int(rule["window"])
+    s = pd.Series(x)
+    rolling = s.rolling(window, min_periods=window)
+    return x, ((s - rolling.mean()) / rolling.std()).to_numpy()
+
+
+def _change(x, rule):
+    periods = int(rule["periods"])
+    s = pd.Series(x)
+    return x, (100.0 * (s / s.shift(periods) - 1.0)).to_numpy()
+
+
+# type: (metric function, comparison, observations of lookback, required keys)
+RULE_TYPES = {
+    "cross_above": (_cross, np.greater_equal, lambda r: 0, []),
+    "cross_below": (_cross, np.less_equal, lambda r: 0, []),
+    "zscore_above": (_zscore, np.greater_equal, lambda r: int(r["window"]) - 1, ["window"]),
+    "zscore_below": (_zscore, np.less_equal, lambda r: int(r["window"]) - 1, ["window"]),
+    "change_above": (_change, np.greater_equal, lambda r: int(r["periods"]), ["periods"]),
+    "change_below": (_change, np.less_equal, lambda r: int(r["periods"]), ["periods"]),
+}
+
+
+def load_rules(path):
+    """Read and validate a rules file. Returns the list of rule dicts."""
+    with open(path) as f:
+        rules = json.load(f)
+    names = set()
+    for rule in rules:
+        missing = {"name", "series", "type", "level"} - set(rule)
+        if missing:
+            raise ValueError(f"Alert rule {rule} is missing {', '.join(sorted(missing))}")
+        if rule["type"] not in RULE_TYPES:
+            raise ValueError(f"Unknown alert rule type {rule['type']} in {rule['name']}")
+        missing = set(RULE_TYPES[rule["type"]][3]) - set(rule)
+        if missing:
+            raise ValueError(f"Alert rule {rule['name']} is missing {', '.join(sorted(missing))}")
+        if rule["name"] in names:
+            raise ValueError(f"Duplicate alert rule name {rule['name']}")
+        names.add(rule["name"])
+    return rules
+
+
+def _lookup(all_data, key):
+    if key in all_data:
+        return all_data[key]
+    group, _, member = key.partition("/")
+    val = all_data.get(group)
+    return val.get(member) if isinstance(val, dict) else None
+
+
+class AlertEngine:
+    """
+    Evaluates rules incrementally; the per-rule state is optionally
+    persisted to state_path between runs.
+    """
+
+    def __init__(self, rules, state_path=None):
+        self.rules = rules
+        self.state_path = state_path
+        self.state = {}
+        if state_path and os.path.isfile(state_path):
+            with open(state_path) as f:
+                self.state = json.load(f)
+
+    def series_keys(self):
+        return sorted({rule["series"] for rule in self.rules})
+
+    def save(self):
+        if self.state_path:
+            tmp = self.state_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.state, f, indent=1)
+            os.replace(tmp, self.state_path)
+
+    def evaluate(self, all_data):
+        """
+        Evaluate every rule over the observations added since its last
+        evaluation. Returns the alerts, oldest first, as dicts with keys
+        rule, series, date, value, metric, message.
+        """
+        arrays = {}
+        alerts = []
+        for rule in self.rules:
+            key = rule["series"]
+            if key not in arrays:
+                df = _lookup(all_data, key)
+                if df is None:
+                    arrays[key] = None
+                else:
+                    df = df.dropna(subset=["value"]).sort_values("date")
+                    arrays[key] = (
+                        df["date"].to_numpy(dtype="datetime64[D]"),
+                        df["value"].to_numpy(dtype="float64"),
+                    )
+            if arrays[key] is None or len(arrays[key][0]) == 0:
+                continue
+            alerts += self._evaluate_rule(rule, *arrays[key])
+        alerts.sort(key=lambda a: a["date"])
+        return alerts
+
+    def _evaluate_rule(self, rule, dates, values):
+        metric_fn, compare, lookback, _ = RULE_TYPES[rule["type"]]
+        state = self.state.get(rule["name"])
+        last = dates[-1]
+        if state and state["rule"] == rule:
+            start = np.searchsorted(dates, np.datetime64(state["last"]), side="right")
+            # a run on an earlier end date does not move the state back
+            last = max(last, np.datetime64(state["last"]))
+        else:
+            start = len(dates) - 1
+        self.state[rule["name"]] = {"rule": rule, "last": str(last)}
+        if start >= len(dates):
+            return []
+
+        # the new observations, plus the lookback for the metric and for the
+        # condition on the observation before the first new one
+        a = max(start - lookback(rule) - 1, 0)
+        x, metric = metric_fn(values[a:], rule)
+        with np.errstate(invalid="ignore"):
+            cond = compare(metric, rule["level"])
+        prev = np.r_[False, cond[:-1]]
+        fired = np.flatnonzero(cond & ~prev)
+        fired = fired[fired >= start - a]
+
+        alerts = []
+        for i in fired:
+            day = str(dates[a + i])
+            text = f"{rule['series']} = {x[i]:.4g}"
+            if rule["type"].startswith("zscore"):
+                text += f", z-score {metric[i]:+.2f}"
+            elif rule["type"].startswith("change"):
+                text += f", {metric[i]:+.1f}% over {rule['periods']} observations"
+            alerts.append({
+                "rule": rule["name"],
+                "series": rule["series"],
+                "date": day,
+                "value": float(x[i]),
+                "metric": float(metric[i]),
+                "message": f"{day} {rule['name']}: {text}",
+            })
+        return alerts
+
+
+def emit(alerts, log_path=None, stream=sys.stdout):
+    """Write alerts to stream and, if given, append them to log_path (JSON lines)."""
+    for alert in alerts:
+        print(f"ALERT {alert['message']}", file=stream)
+    if log_path and alerts:
+        now = datetime.now().isoformat(timespec="seconds")
+        with open(log_path, "a") as f:
+            for alert in alerts:
+                f.write(json.dumps(dict(alert, time=now)) + "\n")
@@ -0,0 +1,230 @@
+# bench_render.py
+"""
+Rendering benchmark of the figure blocks on synthetic all_data.
+
+The series lengths and the series counts are scaled separately. At length
+scale k every series has k times as many points over the same date range
+(k - 1 extra points between consecutive observations, so the series still
+line up on their original dates for the derived ratios). At count scale k
+there are k times as many futures contracts (20 -> 200 -> 2000); the other
+figures have a fixed number of series, so only the futures figures are run
+at count scales. Each figure is timed per stage, with the peak increase of
+the RSS during the stage over its RSS at the start of the stage (so memory
+held by earlier cases does not count):
+
+    plot         the plot_big_picture* calls, excluding tight_layout
+    tight_layout fig.tight_layout() (figures 4 and 5 do not use it)
+    rasterize    fig.canvas.draw(), the Agg rendering
+    encode       PNG encoding of the rendered buffer, as savefig does it
+
+Usage:
+    python bench_render.py                 # BigPicture1-5, lengths and counts 1x, 10x, 100x
+    python bench_render.py --lengths 1 10 --counts 10 --figures 4 5 --csv bench.csv
+"""
+
+import argparse
+import csv
+import io
+import time
+
+import numpy as np
+import pandas as pd
+from matplotlib.image import imsave
+
+import MarketBigPictureWatch as mbw
+
+STAGES = ["plot", "tight_layout", "rasterize", "encode"]
+
+# observation frequency of the raw series by symbol; everything else is monthly
+DAILY_SYMBOLS = {"SOFR", "TEDRATE", "CFSI"}
+WEEKLY_SYMBOLS = {"STLFSI4", "ANFCI"}
+QUARTERLY_SYMBOLS = {"NCBEILQ027S", "TNWMVBSNNCB", "GDPDEF", "GDP", "GDPC1"}
+# indices that are around zero rather than positive levels
+ZERO_CENTERED_SYMBOLS = {"STLFSI4", "ANFCI", "KCFSI", "CFSI"}
+
+
+def _frequency(source, symbol):
+    if source == "yahoo" or symbol in DAILY_SYMBOLS or symbol.startswith("DGS"):
+        return "B"
+    if symbol in WEEKLY_SYMBOLS:
+        return "W-FRI"
+    if symbol in QUARTERLY_SYMBOLS:
+        return "QS"
+    return "MS"
+
+
+def synthetic_series(freq, start, end, scale, rng, zero_centered=False):
+    """A random walk as a date/value DataFrame, scale times denser than freq."""
+    dates = pd.date_range(start, end, freq=freq).to_numpy()
+    if scale > 1 and len(dates) > 1:
+        step = np.diff(dates, append=dates[-1] + (dates[-1] - dates[-2])) // scale
+        dates = np.repeat(dates, scale) + np.tile(np.arange(scale), len(dates)) * np.repeat(step, scale)
+    steps = rng.normal(0, 0.01 / np.sqrt(scale), len(dates))
+    if zero_centered:
+        values = np.cumsum(steps) * 10
+    else:
+        values = 100 * np.exp(np.cumsum(steps))
+    return pd.DataFrame({"date": dates, "value": values})
+
+
+def _closure(keys, derived):
+    """keys and every derived key they depend on."""
+    needed, stack = set(), list(keys)
+    while stack:
+        key = stack.pop()
+        if key not in needed:
+            needed.add(key)
+            stack.extend(derived.get(key, ([], None))[0])
+    return needed
+
+
+def synthetic_data(figures, cfg, scale, count=1, seed=0):
+    """
+    all_data with the inputs of figures, scale times longer series and count
+    times as many futures contracts.
+    """
+    rng = np.random.default_rng(seed)
+    derived = mbw.derived_for(cfg)
+    inputs = [k for name, plot, keys in figures for k in keys]
+    start, end = cfg["date_plotstart"], cfg["date_plotend"]
+
+    all_data = {}
+    specs = {spec[0]: spec for spec in mbw.RAW_SERIES}
+    for key in mbw.raw_inputs(inputs, derived):
+        if key.startswith("futures/"):
+            continue
+        key, source, symbol, name = specs[key]
+        all_data[key] = synthetic_series(
+            _frequency(source, symbol), start, end, scale, rng,
+            zero_centered=symbol in ZERO_CENTERED_SYMBOLS,
+        )
+
+    if "futures_prices" in _closure(inputs, derived):
+        underlying = [
+            f"{comdty} {i}" if i else comdty
+            for i in range(count)
+            for comdty in mbw.futures_underlying
+        ]
+        all_data["futures_underlying"] = underlying
+        all_data["futures_prices"] = {
+            comdty: synthetic_series("B", start, end, scale, rng) for comdty in underlying
+        }
+
+    needed = _closure(inputs, derived)
+    mbw.compute_derived(all_data, {k: v for k, v in derived.items() if k in needed})
+    return all_data
+
+
+def _points(val):
+    if isinstance(val, pd.DataFrame):
+        return len(val)
+    if isinstance(val, dict):
+        return sum(_points(v) for v in val.values())
+    return 0
+
+
+def bench_figure(plot, all_data, cfg):
+    """
+    Render one figure; returns {stage: (seconds, peak RSS increase MB)},
+    the increase over the RSS when the stage started.
+    """
+    result = {}
+    fig = mbw.new_figure(cfg)
+    try:
+        tight = []
+        tight_layout = fig.tight_layout
+
+        def timed_tight_layout(*args, **kwargs):
+            with mbw.PeakRss() as rss:
+                t0 = time.perf_counter()
+                tight_layout(*args, **kwargs)
+                tight.append((time.perf_counter() - t0, rss))
+        fig.tight_layout = timed_tight_layout
+
+        with mbw.PeakRss() as rss:
+            t0 = time.perf_counter()
+            plot(fig, all_data, cfg)
+            seconds = time.perf_counter() - t0
+        tight_seconds = sum(t for t, _ in tight)
+        result["plot"] = (seconds - tight_seconds, rss.peak - rss.start)
+        result["tight_layout"] = (
+            tight_seconds, max((r.peak - r.start for _, r in tight), default=0.0)
+        )
+
+        with mbw.PeakRss() as rss:
+            t0 = time.perf_counter()
+            fig.canvas.draw()
+            result["rasterize"] = (time.perf_counter() - t0, rss.peak - rss.start)
+
+        with mbw.PeakRss() as rss:
+            t0 = time.perf_counter()
+            imsave(io.BytesIO(), fig.canvas.buffer_rgba(), format="png", dpi=fig.dpi)
+            result["encode"] = (time.perf_counter() - t0, rss.peak - rss.start)
+    finally:
+        mbw.close_figure(fig)
+        del fig
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the figure blocks on synthetic data.")
+    parser.add_argument(
+        "--lengths", nargs="+", type=int, default=[1, 10, 100], help="series length scales"
+    )
+    parser.add_argument(
+        "--counts", nargs="+", type=int, default=[10, 100],
+        help="series count scales (futures contracts), at length scale 1",
+    )
+    parser.add_argument(
+        "--figures", nargs="+", default=["1", "2", "3", "4", "5"],
+        help="figures to benchmark, e.g. BigPicture4 or just 4",
+    )
+    parser.add_argument("--csv", help="also write the results to this CSV file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mbw.isverbose = False
+    cfg = mbw.make_config({"date_plotend": "2024-12-31", "figures": args.figures, "series": []})
+    figures = [f for f in mbw.FIGURES if f[0] in cfg["figures"]]
+
+    rows = []
+    header = f"{'figure':<12} {'length':>6} {'count':>5} {'points':>10}" + "".join(
+        f" {stage + ' s':>14}" for stage in STAGES
+    ) + f" {'total s':>8} {'peak +MB':>8}"
+    print(header)
+    cases = [(length, 1) for length in args.lengths]
+    cases += [(1, count) for count in args.counts if count > 1]
+    for scale, count in cases:
+        case_figures = [f for f in figures if count == 1 or "futures_prices" in f[2]]
+        if not case_figures:
+            continue
+        # fresh state, so the derived series of earlier cases are not kept alive
+        mbw.derived_cache, mbw.online_stats = mbw.DerivedCache(), mbw.OnlineStats()
+        all_data = synthetic_data(case_figures, cfg, scale, count)
+        for name, plot, inputs in case_figures:
+            points = sum(_points(all_data[k]) for k in inputs)
+            result = bench_figure(plot, all_data, cfg)
+            total = sum(seconds for seconds, peak in result.values())
+            peak = max(peak for seconds, peak in result.values())
+            print(
+                f"{name:<12} {scale:>6} {count:>5} {points:>10}"
+                + "".join(f" {result[stage][0]:>14.3f}" for stage in STAGES)
+                + f" {total:>8.2f} {peak:>8.0f}"
+            )
+            row = {"figure": name, "length": scale, "count": count, "points": points}
+            for stage in STAGES:
+                row[f"{stage}_s"], row[f"{stage}_peak_increase_mb"] = result[stage]
+            rows.append(row)
+        del all_data
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
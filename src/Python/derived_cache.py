@@ -0,0 +1,198 @@
+# derived_cache.py
+"""
+Incremental recomputation of row-local derived series: series whose row at
+a date depends only on the input rows at that date (ratios, products,
+rescalings, the Treasury curve built across tenors). When SP500 gains one
+day, SP500_gold etc. only need that day recomputed, not 30 years.
+
+Per derived key the state holds the inputs it last processed and its
+output. On a refresh each input is aligned with its processed copy by
+date. Rows dropped from its start (the plot window moving on) only cut the
+start of the output: the output rows before the earliest remaining input
+row go, and those up to the input's new first date are recomputed. The
+rest is compared row by row to find the first date from which it differs
+(appended rows, or revised or dropped ones). The output rows before the
+earliest such date are kept, and the calculation only runs on the input
+rows from that date on. Inputs that are the very same objects as last time
+(e.g. an unchanged derived series) are not compared at all.
+
+A calculation may also depend on a constant computed from the inputs'
+history, e.g. a normalization by the mean of a fixed period. The constant
+is cached with the state. It is recomputed, along with the whole series,
+only when the inputs change (or lose rows) before the end of that period.
+
+The comparison is one vectorized pass over each input. Everything after
+it scales with the new rows only.
+"""
+
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+
+def _columns(df):
+    return [c for c in df.columns if c != "date"]
+
+
+def _first_change(old, new):
+    """
+    The first date at which new differs from old (both sorted by date), None
+    if they are equal, or pd.NaT if they cannot be compared row by row. The
+    rows of old dated before the first row of new are not compared.
+    """
+    if new is old:
+        return None
+    if list(old.columns) != list(new.columns):
+        return pd.NaT
+    old_dates = old["date"].to_numpy(dtype="datetime64[ns]")
+    new_dates = new["date"].to_numpy(dtype="datetime64[ns]")
+    head = np.searchsorted(old_dates, new_dates[0], side="left") if len(new_dates) else 0
+    old_dates = old_dates[head:]
+    n = min(len(old_dates), len(new_dates))
+    same = old_dates[:n] == new_dates[:n]
+    for column in _columns(old):
+        a, b = old[column].to_numpy()[head:head + n], new[column].to_numpy()[:n]
+        if a.dtype != b.dtype:
+            return pd.NaT
+        if a.dtype.kind in "fc":
+            same &= (a == b) | (np.isnan(a) & np.isnan(b))
+        else:
+            same &= a == b
+    if not same.all():
+        i = int(np.argmin(same))
+        return pd.Timestamp(min(old_dates[i], new_dates[i]))
+    if len(old_dates) != len(new_dates):
+        longer = old_dates if len(old_dates) > n else new_dates
+        return pd.Timestamp(longer[n])
+    return None
+
+
+def _from(df, start):
+    return df.iloc[df["date"].searchsorted(start, side="left"):]
+
+
+def _before(df, end):
+    return df.iloc[:df["date"].searchsorted(end, side="left")]
+
+
+class DerivedState:
+    def __init__(self):
+        self.inputs = {}  # input name -> the DataFrame processed last time
+        self.output = None
+        self.constant = None
+
+
+class DerivedCache:
+    """
+    Keeps a DerivedState per derived key; optionally persisted to path
+    between runs.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.series = {}
+        if path and os.path.isfile(path):
+            with open(path, "rb") as f:
+                self.series = pickle.load(f)
+
+    def save(self):
+        if self.path:
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(self.series, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)
+
+    def _changed_from(self, state, frames):
+        """The date to recompute from, None if nothing changed, NaT for all of it."""
+        if state.output is None or state.inputs.keys() != frames.keys():
+            return pd.NaT
+        if not state.output["date"].is_monotonic_increasing:
+            return pd.NaT
+        start = None
+        for name, df in frames.items():
+            if not df["date"].is_monotonic_increasing:
+                return pd.NaT
+            changed = _first_change(state.inputs[name], df)
+            if changed is pd.NaT:
+                return pd.NaT
+            if changed is not None and (start is None or changed < start):
+                start = changed
+        return start
+
+    def _dropped_head(self, state, frames):
+        """
+        None if no input lost rows at its start, else (first, redo_before,
+        dropped): the output rows before first go (no input reaches back
+        there any more), those before redo_before are recomputed (they may
+        have used the lost rows), and dropped is the earliest date lost.
+        """
+        if not all(len(df) for df in frames.values()):
+            return None
+        firsts = {name: df["date"].iloc[0] for name, df in frames.items()}
+        first = redo_before = min(firsts.values())
+        dropped = None
+        for name, old in state.inputs.items():
+            if len(old) and old["date"].iloc[0] < firsts[name]:
+                redo_before = max(redo_before, firsts[name])
+                if dropped is None or old["date"].iloc[0] < dropped:
+                    dropped = old["date"].iloc[0]
+        return None if dropped is None else (first, redo_before, dropped)
+
+    def rowwise(self, key, frames, calc, constant=None):
+        """
+        calc(frames) computed incrementally, for a calc whose output row at
+        a date only depends on the rows of frames ({name: DataFrame with a
+        date column}) at that date.
+
+        constant is None or (func, fixed_before): func(frames) is computed
+        from the rows before fixed_before and passed on as calc(frames, value).
+        """
+        state = self.series.get(key) or DerivedState()
+        start = self._changed_from(state, frames)
+        head = None if start is pd.NaT else self._dropped_head(state, frames)
+        if start is None and head is None:
+            return state.output
+        value = state.constant
+        if constant is not None:
+            func, fixed_before = constant
+            fixed_before = pd.Timestamp(fixed_before)
+            if (
+                start is pd.NaT
+                or value is None
+                or (start is not None and start < fixed_before)
+                or (head is not None and head[2] < fixed_before)
+            ):
+                value = func(frames)
+                start = pd.NaT
+
+        args = () if constant is None else (value,)
+        if start is pd.NaT:
+            output = calc(frames, *args)
+        else:
+            # the recomputed rows at the start, the rows kept, the new tail
+            dates = state.output["date"]
+            parts = []
+            keep_from = 0
+            if head is not None:
+                first, redo_before, _ = head
+                if start is not None:
+                    redo_before = min(redo_before, start)
+                if redo_before > first:
+                    parts.append(calc({name: _before(df, redo_before) for name, df in frames.items()}, *args))
+                keep_from = dates.searchsorted(redo_before, side="left")
+            keep_to = dates.searchsorted(start, side="left") if start is not None else len(dates)
+            parts.append(state.output.iloc[keep_from:max(keep_from, keep_to)])
+            if start is not None:
+                parts.append(calc({name: _from(df, start) for name, df in frames.items()}, *args))
+            if all(list(part.columns) == list(state.output.columns) for part in parts):
+                output = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+            else:
+                output = calc(frames, *args)
+
+        state.inputs = dict(frames)
+        state.output = output
+        state.constant = value
+        self.series[key] = state
+        return output
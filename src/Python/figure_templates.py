@@ -0,0 +1,304 @@
+# figure_templates.py
+"""
+Cached figure templates: lay out and draw the static parts of a figure
+once, then redraw only its data lines and titles.
+
+Every render first runs the plot function against a recorder instead of a
+real figure. The recorder logs each call (add_subplot, twinx, plot,
+set_xlim, legend, tight_layout, ...) with its arguments, which is cheap.
+Two recordings have the same layout when their calls match, ignoring
+- the data (array, list or tuple arguments) of plot() calls, and
+- the text of set_title() and suptitle() calls, which hold the "as of" date.
+
+The first render of a layout replays the calls on a real figure. It marks
+the plotted lines, titles and legends as animated, draws everything else
+once and keeps that as the background (canvas.copy_from_bbox). A later
+render with the same layout restores the background, passes the new data
+to the existing lines with set_data, draws the lines, titles and legends
+with draw_artist, and encodes the canvas buffer. The axes, ticks, grids and
+the tight_layout solve are not redone.
+
+The template is rebuilt when the layout changed, e.g. a different x range,
+figure size or number of series. It is also rebuilt when an autoscaled
+axis would get other limits for the new data (wider or narrower), since
+its ticks would change, so a template render shows the same axes as a
+direct one. Calls with array arguments other than plot() (imshow,
+pcolormesh, ...) are compared by value, so their figures are rebuilt
+whenever those data change.
+
+A plot function that does more than call methods on the figure and its
+axes (e.g. reads back a limit) cannot be recorded. Such figures are
+rendered directly every time.
+"""
+
+import numpy as np
+import pandas as pd
+from matplotlib.image import imsave
+
+import profiling
+
+DATA_METHODS = {"plot"}
+TEXT_METHODS = {"set_title": "label", "suptitle": "t"}
+
+
+class _Proxy:
+    """Stands in for the figure or an axes (or any call result) while recording."""
+
+    def __init__(self, recording, ref):
+        self._recording = recording
+        self._ref = ref
+
+    def __getattr__(self, method):
+        if method.startswith("__"):
+            raise AttributeError(method)
+
+        def call(*args, **kwargs):
+            return self._recording.add(self._ref, method, args, kwargs)
+        return call
+
+
+class Recording:
+    """The calls a plot function made: (target, method, args, kwargs, result)."""
+
+    def __init__(self):
+        self.calls = []
+
+    def add(self, target, method, args, kwargs):
+        result = len(self.calls) + 1  # 0 is the figure
+        self.calls.append((target, method, args, kwargs, result))
+        return _Proxy(self, result)
+
+    def figure(self):
+        return _Proxy(self, 0)
+
+
+def record(plot, all_data, cfg):
+    """The Recording of plot(fig, all_data, cfg), or None if it cannot be recorded."""
+    recording = Recording()
+    try:
+        plot(recording.figure(), all_data, cfg)
+    except Exception:
+        return None
+    return recording
+
+
+def _is_data(val):
+    return isinstance(val, (np.ndarray, pd.Series, pd.Index))
+
+
+def _same(a, b):
+    if isinstance(a, _Proxy) or isinstance(b, _Proxy):
+        return isinstance(a, _Proxy) and isinstance(b, _Proxy) and a._ref == b._ref
+    if _is_data(a) or _is_data(b):
+        if not (_is_data(a) and _is_data(b)):
+            return False
+        a, b = np.asarray(a), np.asarray(b)
+        if a.shape != b.shape or a.dtype != b.dtype:
+            return False
+        return np.array_equal(a, b, equal_nan=a.dtype.kind in "fc")
+    if isinstance(a, (list, tuple)):
+        return (
+            type(a) is type(b)
+            and len(a) == len(b)
+            and all(_same(x, y) for x, y in zip(a, b))
+        )
+    if isinstance(a, dict):
+        return (
+            isinstance(b, dict)
+            and a.keys() == b.keys()
+            and all(_same(a[k], b[k]) for k in a)
+        )
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):
+        return False
+
+
+def _is_plot_data(val):
+    # x or y of a plot() call, e.g. a list of tenors as x
+    return _is_data(val) or isinstance(val, (list, tuple))
+
+
+def _static_args(method, args, kwargs):
+    """args and kwargs with the parts a template redraws left out."""
+    if method in DATA_METHODS:
+        args = tuple(None if _is_plot_data(a) else a for a in args)
+    elif method in TEXT_METHODS:
+        args = args[1:]
+        kwargs = {k: v for k, v in kwargs.items() if k != TEXT_METHODS[method]}
+    return args, kwargs
+
+
+def same_layout(a, b):
+    """Whether recordings a and b differ only in their plotted data and titles."""
+    if len(a.calls) != len(b.calls):
+        return False
+    for (ta, ma, aa, ka, _), (tb, mb, ab, kb, _) in zip(a.calls, b.calls):
+        if ta != tb or ma != mb:
+            return False
+        if not _same(_static_args(ma, aa, ka), _static_args(mb, ab, kb)):
+            return False
+    return True
+
+
+def _resolve(val, objects):
+    if isinstance(val, _Proxy):
+        return objects[val._ref]
+    if isinstance(val, (list, tuple)):
+        return type(val)(_resolve(v, objects) for v in val)
+    if isinstance(val, dict):
+        return {k: _resolve(v, objects) for k, v in val.items()}
+    return val
+
+
+def _xy(args):
+    """(x, y) of a plot() call with one line, or None if it cannot be told apart."""
+    data = [a for a in args if _is_plot_data(a)]
+    if len(data) == 1:
+        y = np.asarray(data[0])
+        return np.arange(len(y)), y
+    if len(data) == 2:
+        return data[0], data[1]
+    return None
+
+
+def _same_autoscale(ax):
+    """
+    Whether autoscaling ax to its current data gives the limits it has, as
+    a direct render would. Changes the limits if not.
+    """
+    if not (ax.get_autoscalex_on() or ax.get_autoscaley_on()):
+        return True
+    limits = ax.get_xlim(), ax.get_ylim()
+    ax.relim()
+    ax.autoscale_view()
+    return np.allclose(limits, (ax.get_xlim(), ax.get_ylim()), rtol=1e-12, atol=0)
+
+
+class FigureTemplate:
+    """A figure drawn once from a Recording, with its data lines and titles redrawn."""
+
+    def __init__(self, fig, recording):
+        self.fig = fig
+        self.recording = recording
+        objects = {0: fig}
+        self.lines = {}  # call index -> the Line2D of a plot() call
+        self.texts = {}  # call index -> the Text of a set_title()/suptitle() call
+        animated = []
+        for i, (target, method, args, kwargs, result) in enumerate(recording.calls):
+            out = getattr(objects[target], method)(
+                *_resolve(args, objects), **_resolve(kwargs, objects)
+            )
+            objects[result] = out
+            if method in DATA_METHODS and len(out) == 1:
+                self.lines[i] = out[0]
+            elif method in TEXT_METHODS:
+                self.texts[i] = out
+            elif method == "legend":
+                animated.append(out)
+        animated += list(self.lines.values()) + list(self.texts.values())
+        for artist in animated:
+            artist.set_animated(True)
+
+        # the order a full draw would use: axes by axes, then the figure's own
+        figure_level = [a for a in animated if a.axes is None]
+        self.artists = [
+            a
+            for ax in sorted(fig.axes, key=lambda ax: ax.get_zorder())
+            for a in sorted((a for a in animated if a.axes is ax), key=lambda a: a.get_zorder())
+        ] + sorted(figure_level, key=lambda a: a.get_zorder())
+
+        fig.canvas.draw()
+        self.background = fig.canvas.copy_from_bbox(fig.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            self.fig.draw_artist(artist)
+
+    def update(self, recording):
+        """
+        Redraw with the data and titles of recording, which has the same
+        layout. Returns False, leaving the template unusable, if the data
+        would autoscale the axes to other limits.
+        """
+        calls = recording.calls
+        if any(m in DATA_METHODS and i not in self.lines for i, (_, m, *_) in enumerate(calls)):
+            return False  # a plot() call drew several lines, which stay static
+        axes = []
+        for i, line in self.lines.items():
+            xy = _xy(calls[i][2])
+            if xy is None:
+                return False
+            line.set_data(*xy)
+            if line.axes not in axes:
+                axes.append(line.axes)
+        if not all(_same_autoscale(ax) for ax in axes):
+            return False
+        for i, text in self.texts.items():
+            args, kwargs = calls[i][2], calls[i][3]
+            text.set_text(args[0] if args else kwargs[TEXT_METHODS[calls[i][1]]])
+        self.recording = recording
+
+        self.fig.canvas.restore_region(self.background)
+        self._draw_artists()
+        return True
+
+    def save(self, path):
+        imsave(path, self.fig.canvas.buffer_rgba(), format="png", dpi=self.fig.dpi)
+
+
+class TemplateCache:
+    """
+    FigureTemplates by figure name, figure size and dpi, for processes that
+    render the same figures repeatedly (intraday mode, batches, backtests).
+    new_figure(cfg) and close_figure(fig) create and tear down the figures.
+    """
+
+    def __init__(self, new_figure, close_figure):
+        self.new_figure = new_figure
+        self.close_figure = close_figure
+        self.templates = {}
+
+    def _drop(self, key):
+        template = self.templates.pop(key, None)
+        if template is not None:
+            self.close_figure(template.fig)
+
+    def render(self, name, plot, all_data, cfg, path):
+        """
+        Render plot to path from the template of name, building it first if
+        needed. Returns "template", "rebuilt" or "direct" (not recordable).
+        """
+        key = (name, tuple(cfg["figsize"]), cfg["dpi"])
+        with profiling.stage("render"):
+            recording = record(plot, all_data, cfg)
+        if recording is None:
+            self._drop(key)
+            fig = self.new_figure(cfg)
+            try:
+                with profiling.stage("render"):
+                    plot(fig, all_data, cfg)
+                with profiling.stage("save"):
+                    fig.savefig(path)
+            finally:
+                self.close_figure(fig)
+            return "direct"
+
+        with profiling.stage("render"):
+            template = self.templates.get(key)
+            how = "template"
+            if template is None or not (
+                same_layout(template.recording, recording) and template.update(recording)
+            ):
+                self._drop(key)
+                template = FigureTemplate(self.new_figure(cfg), recording)
+                self.templates[key] = template
+                how = "rebuilt"
+        with profiling.stage("save"):
+            template.save(path)
+        return how
+
+    def clear(self):
+        for key in list(self.templates):
+            self._drop(key)
@@ -0,0 +1,294 @@
+# intraday.py
+"""
+Intraday mode: poll one-minute bars for the futures, S&P500 and VIX and
+re-render only the short-term futures figure (BigPicture5, with today's
+bars appended to the daily history) and an intraday S&P500/VIX figure.
+
+Each cycle makes one batched request for all symbols. The bars go into a
+fixed-size RingBuffer per symbol; the figures are only re-rendered when a
+bar was added or revised (the latest bar keeps changing until its minute
+is over).
+
+Bars come from Yahoo (yf.download, through the yahoo entry of PROVIDERS)
+or, for testing, from a local stand-in:
+
+    python intraday.py --serve-fake 8765 &
+    python intraday.py --source http://localhost:8765 --interval 5 --cycles 3
+
+The daily history is loaded with the regular pipeline first (reusing
+today's checkpoints).
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+import requests
+import yfinance as yf
+
+import MarketBigPictureWatch as mbw
+from figure_templates import TemplateCache
+
+RING_CAPACITY = 4096  # bars per symbol, about ten sessions of one-minute bars
+SYMBOLS = {"SP500": "^GSPC", "vix": "^VIX", **mbw.futures_contracts}
+
+
+class RingBuffer:
+    """
+    The latest capacity (time, value) bars of one symbol, in preallocated
+    arrays. Every bar is written twice, at i and i + capacity, so the latest
+    bars are always one contiguous slice: view() copies nothing and update()
+    never reallocates.
+    """
+
+    def __init__(self, capacity=RING_CAPACITY):
+        self.capacity = capacity
+        self.times = np.empty(2 * capacity, dtype="datetime64[ns]")
+        self.values = np.empty(2 * capacity, dtype="float64")
+        self.end = 0  # bars written so far
+
+    def __len__(self):
+        return min(self.end, self.capacity)
+
+    def _write(self, times, values):
+        n = len(times)
+        if n > self.capacity:
+            times, values = times[-self.capacity:], values[-self.capacity:]
+            self.end += n - self.capacity
+            n = self.capacity
+        idx = (self.end + np.arange(n)) % self.capacity
+        for offset in (0, self.capacity):
+            self.times[idx + offset] = times
+            self.values[idx + offset] = values
+        self.end += n
+
+    def update(self, times, values):
+        """
+        Add the bars newer than the last one, and revise the last one if it
+        is among them. Returns the number of bars added or revised.
+        """
+        times = np.asarray(times, dtype="datetime64[ns]")
+        values = np.asarray(values, dtype="float64")
+        changed = 0
+        if self.end:
+            i = (self.end - 1) % self.capacity
+            last = self.times[i]
+            same = np.flatnonzero(times == last)
+            if len(same) and self.values[i] != values[same[-1]]:
+                self.values[i] = self.values[i + self.capacity] = values[same[-1]]
+                changed += 1
+            newer = times > last
+            times, values = times[newer], values[newer]
+        self._write(times, values)
+        return changed + len(times)
+
+    def view(self):
+        """(times, values) of the bars held, oldest first, as array views."""
+        n = len(self)
+        start = (self.end - n) % self.capacity
+        return self.times[start:start + n], self.values[start:start + n]
+
+    def frame(self):
+        times, values = self.view()
+        return pd.DataFrame({"date": times, "value": values}, copy=False)
+
+
+# --------------------------------------------------
+# Bar sources: {symbol: (times, closes)} per poll
+# --------------------------------------------------
+
+def _naive(index):
+    # exchange-local wall time, comparable with the daily dates
+    index = pd.DatetimeIndex(index)
+    return index.tz_localize(None) if index.tz is not None else index
+
+
+def yahoo_bars(symbols):
+    """The latest session's one-minute closes of all symbols, in one request."""
+    # called through mbw.PROVIDERS["yahoo"], which holds mbw._yahoo_lock
+    df = yf.download(
+        list(symbols), period="1d", interval="1m", progress=False, group_by="column"
+    )
+    bars = {}
+    if df.empty:
+        return bars
+    closes = df["Close"]
+    for symbol in symbols:
+        if symbol in closes:
+            s = closes[symbol].dropna()
+            bars[symbol] = (_naive(s.index).to_numpy(), s.to_numpy(dtype="float64"))
+    return bars
+
+
+def http_bars(url):
+    def fetch(symbols):
+        resp = requests.get(url, params={"symbols": ",".join(symbols)}, timeout=30)
+        resp.raise_for_status()
+        return {
+            symbol: (
+                pd.to_datetime([t for t, v in rows]).to_numpy(),
+                np.array([v for t, v in rows], dtype="float64"),
+            )
+            for symbol, rows in resp.json().items()
+        }
+    return fetch
+
+
+# --------------------------------------------------
+# Local stand-in serving bars
+# --------------------------------------------------
+
+class _FakeBars:
+    """A random walk per symbol, one bar per real-time second."""
+
+    def __init__(self, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.start = pd.Timestamp.now().floor("s") - pd.Timedelta(minutes=30)
+        self.paths = {}
+        self.lock = threading.Lock()
+
+    def bars(self, symbols):
+        with self.lock:
+            n = int((pd.Timestamp.now() - self.start) / pd.Timedelta(seconds=1)) + 1
+            out = {}
+            for symbol in symbols:
+                path = self.paths.setdefault(symbol, np.empty(0))
+                if len(path) < n:
+                    last = path[-1] if len(path) else 100.0
+                    steps = self.rng.normal(0, 0.001, n - len(path))
+                    path = self.paths[symbol] = np.r_[path, last * np.exp(np.cumsum(steps))]
+                times = self.start + pd.to_timedelta(np.arange(n), unit="s")
+                out[symbol] = [[t.isoformat(), float(v)] for t, v in zip(times, path)]
+            return out
+
+
+def serve_fake(port):
+    bars = _FakeBars()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlsplit(self.path).query)
+            symbols = ",".join(query.get("symbols", [])).split(",")
+            body = json.dumps(bars.bars([s for s in symbols if s])).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    print(f"Serving fake bars on http://localhost:{port}")
+    ThreadingHTTPServer(("localhost", port), Handler).serve_forever()
+
+
+# --------------------------------------------------
+# Polling and rendering
+# --------------------------------------------------
+
+def plot_intraday(fig, all_data, cfg):
+    """S&P500 and VIX one-minute bars: Intraday.png"""
+    for nplot, (key, label, color) in enumerate(
+        [("SP500_intraday", "S&P500", "blue"), ("vix_intraday", "VIX", "red")], start=1
+    ):
+        ax = fig.add_subplot(2, 1, nplot)
+        df = all_data[key]
+        ax.plot(df["date"], df["value"], "-", color=color, linewidth=1, label=label)
+        ax.legend(prop={"size": cfg["legend_fontsize"]}, loc="upper left")
+        ax.grid(True, linestyle=":")
+        ax.set_title(f"{label} Intraday as of {cfg['last_bar']}")
+    fig.tight_layout()
+
+
+def _with_bars(daily, ring):
+    """daily history up to the first bar's day, followed by the bars."""
+    bars = ring.frame()
+    if bars.empty:
+        return daily
+    first_day = bars["date"].iloc[0].normalize()
+    return pd.concat([daily[daily["date"] < first_day], bars], ignore_index=True)
+
+
+def run_intraday(cfg, fetch_bars, interval=60.0, cycles=None):
+    """Poll bars every interval seconds and re-render on new bars."""
+    print("Loading the daily history...\n")
+    daily_cfg = dict(cfg, figures=[], series=["futures_prices", "SP500", "vix"])
+    daily = mbw.run_pipeline(mbw.load_journal(), daily_cfg)
+    rings = {symbol: RingBuffer() for symbol in SYMBOLS.values()}
+    plot5 = {f[0]: f[1] for f in mbw.FIGURES}["BigPicture5"]
+    # between cycles only the lines and titles change: redraw just those
+    templates = TemplateCache(mbw.new_figure, mbw.close_figure)
+
+    cycle = 0
+    while cycles is None or cycle < cycles:
+        t0 = time.monotonic()
+        cycle += 1
+        try:
+            bars = mbw.PROVIDERS["yahoo"].call(fetch_bars, list(rings))
+        except Exception as exc:
+            print(f"!!! Failed to fetch bars: {exc!r}")
+            bars = {}
+        changed = sum(rings[s].update(*bars[s]) for s in bars if s in rings)
+        print(f"{datetime.now():%H:%M:%S} cycle {cycle}: {changed} new or revised bars")
+
+        if changed:
+            all_data = {
+                "futures_underlying": mbw.futures_underlying,
+                "futures_prices": {
+                    comdty: _with_bars(daily["futures_prices"][comdty], rings[symbol])
+                    for comdty, symbol in mbw.futures_contracts.items()
+                },
+                "SP500_intraday": rings[SYMBOLS["SP500"]].frame(),
+                "vix_intraday": rings[SYMBOLS["vix"]].frame(),
+            }
+            # extend the x axis to the latest bar
+            last = pd.Timestamp(max(r.view()[0][-1] for r in rings.values() if len(r)))
+            render_cfg = dict(cfg, xlim_end=max(cfg["xlim_end"], last))
+            render_cfg["last_bar"] = f"{last:%Y-%m-%d %H:%M}"
+            mbw.render_figure("BigPicture5", plot5, all_data, render_cfg, templates)
+            mbw.render_figure("Intraday", plot_intraday, all_data, render_cfg, templates)
+
+        if cycles is None or cycle < cycles:
+            time.sleep(max(0.0, interval - (time.monotonic() - t0)))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Refresh the short-term futures and S&P500/VIX figures from intraday bars."
+    )
+    parser.add_argument("--source", help="URL of a bar server (default: Yahoo)")
+    parser.add_argument("--interval", type=float, default=60.0, help="seconds between polls")
+    parser.add_argument("--cycles", type=int, help="stop after this many polls")
+    parser.add_argument("--output-dir", help="directory for the pictures")
+    parser.add_argument("--serve-fake", type=int, metavar="PORT", help="serve fake bars on PORT")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.serve_fake:
+        serve_fake(args.serve_fake)
+        return
+    mbw.isverbose = False
+    overrides = {"figures": [], "series": []}
+    if args.output_dir:
+        overrides["output_dir"] = args.output_dir
+    cfg = mbw.make_config(overrides)
+    os.makedirs(cfg["output_dir"], exist_ok=True)
+    fetch_bars = http_bars(args.source) if args.source else yahoo_bars
+    try:
+        run_intraday(cfg, fetch_bars, args.interval, args.cycles)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# online_stats.py
+"""
+Incremental valuation statistics: the historical percentile rank and the
+rolling z-score of a series, kept as per-series state so each refresh only
+processes the observations added since the last one.
+
+Per series the state holds
+- every value seen so far in sorted order (order statistics): the
+  percentile rank of a new value is a bisect, O(log n), and inserting it is
+  a single memmove of a float list, which is negligible at these lengths;
+- the values inside the rolling window with their running sum and sum of
+  squares, so the rolling mean/std are O(1) per new value (amortized);
+- the output series computed so far.
+
+If the already-processed part of a series changes (a data revision, or a
+history that starts on another date, e.g. the plot window moving on), that
+series' state is rebuilt from scratch, so the statistics only depend on the
+series given and not on what earlier runs processed.
+
+Until a series has MIN_OBSERVATIONS values (in its history for the rank,
+in the rolling window for the z-score) the statistics are NaN: the first
+value of a series would otherwise rank at 100 with a z-score of 0.
+"""
+
+import bisect
+import math
+import os
+import pickle
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+ZSCORE_WINDOW_DAYS = 3653  # 10 years
+MIN_OBSERVATIONS = 24  # two years of a monthly series
+
+
+class SeriesStats:
+    def __init__(self, window_days=ZSCORE_WINDOW_DAYS, min_observations=MIN_OBSERVATIONS):
+        self.window_days = window_days
+        self.min_observations = min_observations
+        self.sorted_values = []
+        self.window = deque()  # (day number, shifted value)
+        self.shift = None  # first value, to keep the running sums well conditioned
+        self.sum = self.sumsq = 0.0
+        self.n = 0
+        self.last_date = None
+        self.values = np.empty(0)  # processed values, to detect revisions
+        self.dates, self.pctrank, self.zscore = [], [], []
+
+    def matches(self, dates, values):
+        """
+        True if the series still agrees with what has been processed. A
+        series whose history starts elsewhere does not: every percentile
+        rank depends on all the values before it.
+        """
+        if self.last_date is None:
+            return True
+        n = np.searchsorted(dates, self.last_date, side="right")
+        return n == self.n and np.array_equal(values[:n], self.values)
+
+    def update(self, dates, values):
+        """Process the observations dated after the last processed one."""
+        start = 0 if self.last_date is None else np.searchsorted(dates, self.last_date, side="right")
+        days = dates.astype("datetime64[D]").astype("int64")
+        for i in range(start, len(dates)):
+            x = float(values[i])
+            if self.shift is None:
+                self.shift = x
+            y = x - self.shift
+
+            # percentile rank among all values so far (including this one)
+            bisect.insort(self.sorted_values, x)
+            rank = bisect.bisect_right(self.sorted_values, x)
+            total = len(self.sorted_values)
+            self.pctrank.append(100.0 * rank / total if total >= self.min_observations else np.nan)
+
+            # z-score against the rolling window ending at this observation
+            self.window.append((days[i], y))
+            self.sum += y
+            self.sumsq += y * y
+            while self.window[0][0] <= days[i] - self.window_days:
+                _, old = self.window.popleft()
+                self.sum -= old
+                self.sumsq -= old * old
+            m = len(self.window)
+            mean = self.sum / m
+            var = (self.sumsq - m * mean * mean) / (m - 1) if m > 1 else 0.0
+            if m < self.min_observations:
+                self.zscore.append(np.nan)
+            else:
+                self.zscore.append((y - mean) / math.sqrt(var) if var > 0 else 0.0)
+
+            self.dates.append(dates[i])
+            self.n += 1
+        if start < len(dates):
+            self.last_date = dates[-1]
+            self.values = np.concatenate([self.values, values[start:]])
+
+    def frame(self, column):
+        return pd.DataFrame({
+            "date": pd.to_datetime(np.array(self.dates, dtype="datetime64[ns]")),
+            "value": getattr(self, column),
+        })
+
+
+class OnlineStats:
+    """
+    Keeps a SeriesStats per key; optionally persisted to path between runs.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.series = {}
+        if path and os.path.isfile(path):
+            with open(path, "rb") as f:
+                self.series = pickle.load(f)
+
+    def save(self):
+        if self.path:
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(self.series, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)
+
+    def _update(self, key, df):
+        df = df.dropna(subset=["value"]).sort_values("date")
+        dates = df["date"].to_numpy(dtype="datetime64[ns]")
+        values = df["value"].to_numpy(dtype="float64")
+        state = self.series.get(key)
+        if (
+            state is None
+            or getattr(state, "min_observations", None) != MIN_OBSERVATIONS
+            or not state.matches(dates, values)
+        ):
+            state = self.series[key] = SeriesStats()
+        state.update(dates, values)
+        return state
+
+    def pctrank(self, key, df):
+        """Percentile rank (0-100) of each value among all values up to it."""
+        return self._update(key, df).frame("pctrank")
+
+    def zscore(self, key, df):
+        """Z-score of each value against the trailing ZSCORE_WINDOW_DAYS."""
+        return self._update(key, df).frame("zscore")
@@ -0,0 +1,169 @@
+# profiling.py
+"""
+Low-overhead, stage-aware sampling profiler for the pipeline (--profile).
+
+Code marks its stages with
+
+    with profiling.stage("fetch"):
+        ...
+
+which costs next to nothing while no profiler runs. Once start(out_dir) is
+called, a background thread wakes every INTERVAL seconds, reads the stacks
+of all threads with sys._current_frames() and counts the stack of every
+thread that is inside a stage under that (innermost) stage. Threads outside
+any stage, e.g. the main thread waiting for downloads, are not sampled. The
+sampled threads are never interrupted, so the overhead is the sampler's own
+few stack walks per interval.
+
+stop() writes to out_dir:
+    profile.txt             per stage: calls, wall time, samples, and the
+                            functions with the most samples (self and total)
+    <stage>.collapsed       collapsed stacks ("f1;f2;f3 count" per line) for
+                            flame graph tools (flamegraph.pl, speedscope)
+    all.collapsed           all stages, with the stage as the root frame
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+INTERVAL = 0.005  # seconds between samples
+TOP_FUNCTIONS = 15
+
+_profiler = None
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.stack = self.profiler._stages.setdefault(threading.get_ident(), [])
+        self.stack.append(self.name)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        dt = time.perf_counter() - self.t0
+        self.stack.pop()
+        with self.profiler._lock:
+            self.profiler.wall[self.name] += dt
+            self.profiler.calls[self.name] += 1
+        return False
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+    def __init__(self, out_dir, interval=INTERVAL):
+        self.out_dir = out_dir
+        self.interval = interval
+        self.wall = defaultdict(float)
+        self.calls = Counter()
+        self.samples = defaultdict(Counter)  # stage -> Counter of stack tuples
+        self._stages = {}  # thread id -> stage stack
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for tid, stack in list(self._stages.items()):
+                if tid == own or tid not in frames:
+                    continue
+                try:
+                    name = stack[-1]
+                except IndexError:
+                    continue
+                names = []
+                frame = frames[tid]
+                while frame is not None:
+                    names.append(_frame_name(frame))
+                    frame = frame.f_back
+                self.samples[name][tuple(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        os.makedirs(self.out_dir, exist_ok=True)
+        with open(os.path.join(self.out_dir, "all.collapsed"), "w") as f_all:
+            for name, stacks in self.samples.items():
+                with open(os.path.join(self.out_dir, f"{name}.collapsed"), "w") as f:
+                    for frames, count in stacks.most_common():
+                        f.write(f"{';'.join(frames)} {count}\n")
+                        f_all.write(f"{name};{';'.join(frames)} {count}\n")
+        report = self.report()
+        with open(os.path.join(self.out_dir, "profile.txt"), "w") as f:
+            f.write(report)
+        return report
+
+    def report(self):
+        lines = [
+            f"Sampling every {self.interval * 1000:.0f} ms; wall time includes nested stages.",
+            "",
+            f"{'stage':<10} {'calls':>7} {'wall s':>9} {'samples':>8}",
+        ]
+        names = sorted(set(self.wall) | set(self.samples), key=lambda n: -self.wall[n])
+        for name in names:
+            lines.append(
+                f"{name:<10} {self.calls[name]:>7} {self.wall[name]:>9.2f} "
+                f"{sum(self.samples[name].values()):>8}"
+            )
+        for name in names:
+            stacks = self.samples[name]
+            total = sum(stacks.values())
+            if not total:
+                continue
+            own, inclusive = Counter(), Counter()
+            for frames, count in stacks.items():
+                own[frames[-1]] += count
+                for frame in set(frames):
+                    inclusive[frame] += count
+            lines += ["", f"[{name}] {total} samples", f"{'self %':>7} {'total %':>7}  function"]
+            for frame, count in own.most_common(TOP_FUNCTIONS):
+                lines.append(
+                    f"{100 * count / total:>7.1f} {100 * inclusive[frame] / total:>7.1f}  {frame}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+def stage(name):
+    """Context manager marking a pipeline stage of the current thread."""
+    if _profiler is None:
+        return _NO_STAGE
+    return _Stage(_profiler, name)
+
+
+def start(out_dir, interval=INTERVAL):
+    global _profiler
+    _profiler = Profiler(out_dir, interval)
+    _profiler.start()
+
+
+def stop():
+    """Stop profiling and write the results; returns the report text."""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler.stop() if profiler else ""
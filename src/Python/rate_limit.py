@@ -0,0 +1,175 @@
+# rate_limit.py
+"""
+Per-provider request limiting for the downloads: a token bucket caps the
+request rate, an adaptive limit caps the requests in flight, and failed
+requests are retried with jittered exponential backoff.
+
+The concurrency limit follows AIMD (additive increase, multiplicative
+decrease), as in TCP congestion control: every request that succeeds
+without a latency spike raises the limit by 1/limit (about +1 per round of
+requests), up to max_concurrency; a failure halves it. Latency is judged
+against the fastest latency seen so far, so a provider that slows down
+under load stops the limit from growing before it starts returning errors.
+
+Retries wait for the provider's Retry-After header when it sends one
+(seconds or an HTTP date), otherwise for a "full jitter" backoff: a random
+delay in [0, min(max_delay, base_delay * 2**attempt)].
+"""
+
+import contextlib
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    """At most burst requests at once, refilled at rate requests/second."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimit:
+    """Limit on the requests in flight, adjusted by AIMD."""
+
+    def __init__(self, max_concurrency, initial=2, latency_factor=3.0):
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(initial, max_concurrency))
+        self.latency_factor = latency_factor
+        self.min_latency = None
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, ok, latency=None):
+        with self._cond:
+            self.in_flight -= 1
+            if not ok:
+                self.limit = max(1.0, self.limit / 2)
+            elif latency is not None:
+                if self.min_latency is None or latency < self.min_latency:
+                    self.min_latency = latency
+                if latency <= self.latency_factor * max(self.min_latency, 0.05):
+                    self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+def _status(exc):
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def retry_after(exc):
+    """Seconds to wait from the Retry-After header of exc's response, or None."""
+    response = getattr(exc, "response", None)
+    value = getattr(response, "headers", {}).get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def is_retryable(exc):
+    """Client errors (other than timeouts and throttling) are not retried."""
+    status = _status(exc)
+    if status is not None:
+        return status in (408, 429) or status >= 500
+    return not isinstance(exc, (ValueError, TypeError, KeyError, AttributeError))
+
+
+class Provider:
+    """
+    Rate limit, concurrency limit and retries for the requests to one data
+    provider. call(fn, *args) runs fn under all three. serialize is a lock
+    held around each call for a client that cannot make requests
+    concurrently; the latency is timed once it is held.
+    """
+
+    def __init__(
+        self, name, rate, burst, max_concurrency, max_retries=4, base_delay=1.0, max_delay=60.0,
+        serialize=None,
+    ):
+        self.name = name
+        self.serialize = serialize
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AdaptiveLimit(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.requests = self.retries = self.failures = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Zero the request counters of summary(), e.g. at the start of a run."""
+        with self._lock:
+            self.requests = self.retries = self.failures = 0
+
+    def backoff(self, attempt, exc):
+        wait = retry_after(exc)
+        if wait is None:
+            wait = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        return min(wait, self.max_delay)
+
+    def call(self, fn, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self.concurrency.acquire()
+            with self._lock:
+                self.requests += 1
+            try:
+                with self.serialize or contextlib.nullcontext():
+                    t0 = time.monotonic()
+                    result = fn(*args, **kwargs)
+                    latency = time.monotonic() - t0
+            except Exception as exc:
+                # only transient errors say anything about the provider's load
+                retryable = is_retryable(exc)
+                self.concurrency.release(ok=not retryable)
+                with self._lock:
+                    self.failures += 1
+                if attempt == self.max_retries or not retryable:
+                    raise
+                wait = self.backoff(attempt, exc)
+                print(f"    {self.name}: {exc!r}, retrying in {wait:.1f} s")
+                with self._lock:
+                    self.retries += 1
+                time.sleep(wait)
+            else:
+                self.concurrency.release(ok=True, latency=latency)
+                return result
+
+    def summary(self):
+        return (
+            f"{self.name}: {self.requests} requests, {self.retries} retries, "
+            f"{self.failures} failures, concurrency limit {int(self.concurrency.limit)}"
+        )
@@ -0,0 +1,107 @@
+# relative_value.py
+"""
+Cross-asset relative value over the futures universe, the S&P500 and the
+VIX, computed for all pairs at once from one aligned matrix of log prices
+instead of one merge per pair.
+
+For assets i and j the log ratio is d = x_i - x_j (x = log price), so
+- the return spread over p periods is r_i - r_j with r = x(t) - x(t - p):
+  one outer difference of the return vector gives every pair;
+- the z-score of today's ratio against the trailing window needs the mean
+  and variance of d over the rows where both are quoted. With M the 0/1
+  matrix of quoted values and X the (centered) log prices, those sums are
+  the matrix products (M X)'M, (M X^2)'M and (M X)'(M X), so all pairs
+  come out of a few products over the window.
+
+log_price_matrix() builds the aligned matrix, zscore_matrix() and
+return_spread_matrix() give the current value for every pair, and
+pair_series() the history of any one pair on demand.
+"""
+
+import numpy as np
+import pandas as pd
+
+ZSCORE_WINDOW = 252  # trading days
+MIN_OBSERVATIONS = 60  # fewer common observations in the window give NaN
+RETURN_PERIODS = 63  # trading days, about three months
+MAX_GAP = 5  # rows a price is carried over when its market is closed
+
+
+def log_price_matrix(series, max_gap=MAX_GAP):
+    """
+    series: {asset: DataFrame with columns date, value}. Returns a DataFrame
+    with a date column and the log price of every asset, aligned on the
+    union of their dates. A price is carried forward over at most max_gap
+    rows (holidays differ between markets); non-positive prices are NaN.
+    """
+    wide = pd.concat(
+        [
+            df.drop_duplicates("date", keep="last").set_index("date")["value"].rename(asset)
+            for asset, df in series.items()
+        ],
+        axis=1,
+    ).sort_index()
+    logp = np.log(wide.where(wide > 0)).ffill(limit=max_gap).dropna(how="all")
+    logp.index.name = "date"
+    return logp.reset_index()
+
+
+def _assets(logp):
+    return [c for c in logp.columns if c != "date"]
+
+
+def zscore_matrix(logp, window=ZSCORE_WINDOW, min_obs=MIN_OBSERVATIONS):
+    """
+    z-score of the latest log ratio of every pair (row asset over column
+    asset) against its mean and standard deviation over the last window
+    rows, as an assets x assets DataFrame.
+    """
+    assets = _assets(logp)
+    X = logp[assets].to_numpy(dtype="float64")[-window:]
+    quoted = ~np.isnan(X)
+    M = quoted.astype("float64")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        center = np.nansum(X, axis=0) / M.sum(axis=0)
+        Xc = np.where(quoted, X - center, 0.0)
+
+        n = M.T @ M
+        A = Xc.T @ M
+        B = (Xc * Xc).T @ M
+        P = Xc.T @ Xc
+        mean = (A - A.T) / n
+        var = (B + B.T - 2 * P - n * mean * mean) / (n - 1)
+
+        now = np.where(quoted[-1], Xc[-1], np.nan)
+        z = (now[:, None] - now[None, :] - mean) / np.sqrt(var)
+    z[(n < min_obs) | ~(var > 0)] = np.nan
+    np.fill_diagonal(z, np.nan)
+    return pd.DataFrame(z, index=assets, columns=assets)
+
+
+def return_spread_matrix(logp, periods=RETURN_PERIODS):
+    """
+    Log return of the row asset minus that of the column asset over the
+    last periods rows, in percent, as an assets x assets DataFrame.
+    """
+    assets = _assets(logp)
+    X = logp[assets].to_numpy(dtype="float64")
+    r = 100 * (X[-1] - X[-1 - periods])
+    return pd.DataFrame(r[:, None] - r[None, :], index=assets, columns=assets)
+
+
+def pair_series(logp, a, b, window=ZSCORE_WINDOW, periods=RETURN_PERIODS):
+    """
+    History of the pair a/b: DataFrame with columns date, value (the price
+    ratio), zscore (of the log ratio over the trailing window rows) and
+    return_spread (percent over periods rows).
+    """
+    d = (logp[a] - logp[b]).to_numpy()
+    s = pd.Series(d)
+    rolling = s.rolling(window, min_periods=MIN_OBSERVATIONS)
+    df = pd.DataFrame({
+        "date": logp["date"].to_numpy(),
+        "value": np.exp(d),
+        "zscore": ((s - rolling.mean()) / rolling.std()).to_numpy(),
+        "return_spread": 100 * (s - s.shift(periods)).to_numpy(),
+    })
+    return df.dropna(subset=["value"]).reset_index(drop=True)
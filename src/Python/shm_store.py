@@ -0,0 +1,113 @@
+# shm_store.py
+"""
+Share all_data with worker processes through one shared-memory block,
+instead of pickling the DataFrames into every worker.
+
+The parent publishes every column of every DataFrame (dates as int64
+nanoseconds, values as float64, ...) once into a SharedMemory block and
+keeps a small manifest of where each column is. Workers attach to the block
+by name and rebuild all_data from read-only NumPy views of it, so the data
+exists once no matter how many workers there are, and attaching costs
+nothing per row.
+
+The manifest mirrors the structure of all_data:
+    ("frame", n, [(column, dtype, offset), ...])   a DataFrame of n rows
+    ("dict", {member: entry})                      e.g. caseshiller
+    ("object", value)                              anything else (e.g. a
+                                                   list of names), pickled
+                                                   along with the manifest
+DataFrames with columns of other dtypes (object, ...) or indexed by labels
+(e.g. a matrix of assets x assets) are also kept as "object" entries; the
+integer index of the others is not kept.
+
+    with SharedSeriesStore(all_data) as store:
+        ... pass store.name and store.manifest to the workers, which call
+        attach(name, manifest) ...
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+ALIGN = 64
+
+
+def _column_array(series):
+    arr = series.to_numpy()
+    if arr.dtype.kind in "fiub":
+        return arr
+    if arr.dtype.kind == "M":
+        return arr.astype("datetime64[ns]")
+    return None
+
+
+def _plan(val, arrays, offset):
+    """Return (manifest entry, next offset), collecting (offset, array) to copy."""
+    # the index is not kept, so frames indexed by labels are pickled instead
+    if (
+        isinstance(val, pd.DataFrame)
+        and val.columns.is_unique
+        and val.index.dtype.kind in "iu"
+    ):
+        cols = [_column_array(val[c]) for c in val.columns]
+        if all(arr is not None for arr in cols):
+            columns = []
+            for name, arr in zip(val.columns, cols):
+                columns.append((name, arr.dtype.str, offset))
+                arrays.append((offset, np.ascontiguousarray(arr)))
+                offset += -(-arr.nbytes // ALIGN) * ALIGN
+            return ("frame", len(val), columns), offset
+    if isinstance(val, dict):
+        entries = {}
+        for key, member in val.items():
+            entries[key], offset = _plan(member, arrays, offset)
+        return ("dict", entries), offset
+    return ("object", val), offset
+
+
+class SharedSeriesStore:
+    """The parent side: publishes all_data and owns the shared block."""
+
+    def __init__(self, all_data):
+        arrays = []
+        self.manifest, size = _plan(dict(all_data), arrays, 0)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for offset, arr in arrays:
+            self.shm.buf[offset:offset + arr.nbytes] = arr.view("uint8").reshape(-1)
+        self.name = self.shm.name
+        self.nbytes = size
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _build(entry, buf):
+    kind = entry[0]
+    if kind == "frame":
+        _, n, columns = entry
+        data = {}
+        for name, dtype, offset in columns:
+            arr = np.frombuffer(buf, dtype=np.dtype(dtype), count=n, offset=offset)
+            data[name] = arr
+        return pd.DataFrame(data, copy=False)
+    if kind == "dict":
+        return {key: _build(member, buf) for key, member in entry[1].items()}
+    return entry[1]
+
+
+def attach(name, manifest):
+    """
+    The worker side: return (all_data, shm) with the DataFrames as read-only
+    views of the shared block. Keep shm referenced while all_data is in use.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    buf = shm.buf.toreadonly()
+    return _build(manifest, buf), shm
@@ -0,0 +1,139 @@
+# tile_export.py
+"""
+Export the series in all_data as pre-aggregated, multi-resolution JSON tiles
+for zoomable browser charts, so a client only downloads the tiles for its
+current viewport and zoom level.
+
+All series share one time grid: days are counted from EPOCH, and at zoom
+level z a bucket spans 2**(Z0_SHIFT - z) days (512 days at z = 0, one day at
+z = 9). A tile holds TILE_BUCKETS consecutive buckets, so tile x at zoom z
+covers buckets [x * TILE_BUCKETS, (x + 1) * TILE_BUCKETS) and the same
+(z, x) is the same time range for every series. A series' max_zoom is the
+first level whose buckets are no wider than its typical sampling interval;
+clients zooming further just reuse those tiles.
+
+Files under out_dir:
+    manifest.json             grid parameters and, per series, its date
+                              range, max_zoom and the tiles at each zoom
+    <key>/<z>/<x>.json        {"b": bucket offsets in the tile,
+                               "min": [...], "max": [...], "last": [...]}
+                              or {"b": [...], "v": [...]} when every bucket
+                              holds a single value
+
+Nested entries of all_data (e.g. caseshiller) are exported as
+"caseshiller/Chicago". Missing and infinite values (e.g. a ratio to a zero)
+are left out. Tiles whose content has not changed since the last export
+are not rewritten.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+EPOCH = np.datetime64("1850-01-01", "D")
+TILE_BUCKETS = 256  # 2**8
+Z0_SHIFT = 9  # bucket width at zoom 0 is 2**9 days, so 2**17 days per tile
+
+
+def _is_series(val):
+    return isinstance(val, pd.DataFrame) and {"date", "value"} <= set(val.columns)
+
+
+def iter_series(all_data):
+    """Yield (key, DataFrame) for every date/value series in all_data."""
+    for key, val in all_data.items():
+        if _is_series(val):
+            yield key, val
+        elif isinstance(val, dict):
+            for k2, df2 in val.items():
+                if _is_series(df2):
+                    yield f"{key}/{k2}", df2
+
+
+def _max_zoom(days):
+    if len(days) < 2:
+        return 0
+    interval = max(np.median(np.diff(days)), 1)
+    zoom = Z0_SHIFT - int(np.floor(np.log2(interval)))
+    return int(min(max(zoom, 0), Z0_SHIFT))
+
+
+def _write_if_changed(path, text):
+    if os.path.isfile(path):
+        with open(path) as f:
+            if f.read() == text:
+                return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+    return True
+
+
+def series_tiles(df):
+    """
+    Aggregate one series. Yields (z, x, tile dict) for every non-empty tile
+    at zoom levels 0.._max_zoom.
+    """
+    df = df.sort_values("date")
+    values = df["value"].to_numpy(dtype="float64")
+    finite = np.isfinite(values)  # JSON has no NaN or infinity
+    days = (df["date"].to_numpy(dtype="datetime64[D]")[finite] - EPOCH).astype("int64")
+    values = values[finite]
+    if len(days) == 0:
+        return
+
+    for z in range(_max_zoom(days) + 1):
+        buckets = days >> (Z0_SHIFT - z)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(buckets)]
+        bucket_ids = buckets[starts]
+        vmin = np.minimum.reduceat(values, starts)
+        vmax = np.maximum.reduceat(values, starts)
+        vlast = values[ends - 1]
+        single = (ends - starts) == 1
+
+        tiles = bucket_ids // TILE_BUCKETS
+        tile_starts = np.flatnonzero(np.r_[True, tiles[1:] != tiles[:-1]])
+        tile_ends = np.r_[tile_starts[1:], len(tiles)]
+        for a, b in zip(tile_starts, tile_ends):
+            tile = {"b": (bucket_ids[a:b] % TILE_BUCKETS).tolist()}
+            if single[a:b].all():
+                tile["v"] = vlast[a:b].tolist()
+            else:
+                tile["min"] = vmin[a:b].tolist()
+                tile["max"] = vmax[a:b].tolist()
+                tile["last"] = vlast[a:b].tolist()
+            yield z, int(tiles[a]), tile
+
+
+def export_tiles(all_data, out_dir):
+    """
+    Write the tiles of every series in all_data and the manifest to out_dir.
+    Returns the number of tile files written.
+    """
+    manifest = {
+        "epoch": str(EPOCH),
+        "tile_buckets": TILE_BUCKETS,
+        "bucket_days_z0": 2**Z0_SHIFT,
+        "series": {},
+    }
+    written = 0
+    for key, df in iter_series(all_data):
+        tiles = {}
+        for z, x, tile in series_tiles(df):
+            path = os.path.join(out_dir, *key.split("/"), str(z), f"{x}.json")
+            written += _write_if_changed(path, json.dumps(tile, separators=(",", ":")))
+            tiles.setdefault(str(z), []).append(x)
+        if not tiles:
+            continue
+        manifest["series"][key] = {
+            "first": df["date"].min().strftime("%Y-%m-%d"),
+            "last": df["date"].max().strftime("%Y-%m-%d"),
+            "n": len(df),
+            "max_zoom": max(int(z) for z in tiles),
+            "tiles": tiles,
+        }
+    _write_if_changed(os.path.join(out_dir, "manifest.json"), json.dumps(manifest, indent=1))
+    return written
@@ -0,0 +1,212 @@
+# vintage_store.py
+"""
+Append-only, vintage-aware store of the downloaded series.
+
+Each commit of a series records what the series looked like on that day
+(its "vintage"), so data revisions such as GDP or payrolls are kept instead
+of being overwritten. A series is split into calendar chunks (months for
+daily data, years otherwise) and every chunk is stored once under the hash
+of its content. A commit only writes the chunks that are new or revised,
+and only appends a ref line when something changed, so storage grows with
+the number of revisions rather than the number of days.
+
+Layout under root:
+    objects/ab/cdef...        zlib-compressed chunk (int64 dates + float64 values)
+    refs/<key>.jsonl          one line per vintage: {"asof", "set", "drop"[, "full"]}
+
+Reading "series X as known on date D" bisects the ref lines by date and
+replays at most FULL_EVERY deltas from the nearest full snapshot.
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import threading
+import uuid
+import zlib
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+FULL_EVERY = 32  # write a full snapshot line after this many deltas
+
+
+def _key_fn(key):
+    return key.replace("/", "__") + ".jsonl"
+
+
+def _split_chunks(df):
+    """
+    Return {period: payload bytes} for a date/value DataFrame sorted by date.
+    """
+    dates = pd.to_datetime(df["date"]).to_numpy(dtype="datetime64[ns]")
+    values = df["value"].to_numpy(dtype="float64")
+    if len(dates) == 0:
+        return {}
+    monthly = len(dates) > 1 and np.median(np.diff(dates)) <= np.timedelta64(7, "D")
+    unit = "M" if monthly else "Y"
+    periods = dates.astype(f"datetime64[{unit}]")
+    starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+    ends = np.r_[starts[1:], len(dates)]
+    ints = dates.view("int64")
+    return {
+        str(periods[a]): ints[a:b].tobytes() + values[a:b].tobytes()
+        for a, b in zip(starts, ends)
+    }
+
+
+class VintageStore:
+    def __init__(self, root):
+        self.root = root
+        self._refs = {}  # key -> list of ref lines, loaded lazily
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "refs"), exist_ok=True)
+
+    # ---------- objects ----------
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest[2:])
+
+    def _put(self, payload):
+        """Store payload under its hash; returns (digest, whether it was new)."""
+        digest = hashlib.sha256(payload).hexdigest()
+        path = self._object_path(digest)
+        if os.path.isfile(path):
+            return digest, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(payload))
+        os.replace(tmp, path)
+        return digest, True
+
+    def _get(self, digest):
+        with open(self._object_path(digest), "rb") as f:
+            payload = zlib.decompress(f.read())
+        n = len(payload) // 16
+        dates = np.frombuffer(payload, dtype="int64", count=n)
+        values = np.frombuffer(payload, dtype="float64", count=n, offset=8 * n)
+        return dates, values
+
+    # ---------- refs ----------
+
+    def _ref_lines(self, key):
+        if key not in self._refs:
+            lines = []
+            path = os.path.join(self.root, "refs", _key_fn(key))
+            if os.path.isfile(path):
+                with open(path) as f:
+                    lines = [json.loads(line) for line in f if line.strip()]
+            self._refs[key] = lines
+        return self._refs[key]
+
+    def _state(self, lines, upto):
+        """Fold ref lines[:upto] into {period: digest}."""
+        start = upto - 1
+        while start > 0 and not lines[start].get("full"):
+            start -= 1
+        state = {}
+        for line in lines[start:upto]:
+            state.update(line["set"])
+            for period in line.get("drop", []):
+                state.pop(period, None)
+        return state
+
+    def keys(self):
+        return sorted(
+            fn[: -len(".jsonl")].replace("__", "/")
+            for fn in os.listdir(os.path.join(self.root, "refs"))
+            if fn.endswith(".jsonl")
+        )
+
+    def vintages(self, key):
+        """Dates on which a new vintage of key was recorded."""
+        with self._lock:
+            return sorted({line["asof"] for line in self._ref_lines(key)})
+
+    def commit(self, key, df, asof=None):
+        """
+        Record df as the vintage of key known on asof (default today).
+        Only new or revised chunks are written; stored chunks older than
+        df's first date are kept. Returns the number of chunks written
+        (0 if nothing changed).
+        """
+        asof = (asof or date.today()).isoformat()
+        chunks = _split_chunks(df)
+        with self._lock:
+            lines = self._ref_lines(key)
+            old = self._state(lines, len(lines))
+
+        # df may cover a shorter history than what is stored (a shorter
+        # download horizon): keep the older chunks, and don't mistake a
+        # truncated first chunk for a revision
+        if chunks:
+            first = min(chunks)
+            if first in old and (
+                np.frombuffer(chunks[first], dtype="int64", count=1)[0]
+                > self._get(old[first])[0][0]
+            ):
+                del chunks[first]
+        if not chunks:
+            return 0
+        first, last = min(chunks), max(chunks)
+
+        new = {period: self._put(payload) for period, payload in chunks.items()}
+        written = sum(is_new for digest, is_new in new.values())
+
+        with self._lock:
+            lines = self._ref_lines(key)
+            old = self._state(lines, len(lines))
+            changed = {
+                period: digest
+                for period, (digest, is_new) in new.items()
+                if old.get(period) != digest
+            }
+            dropped = sorted(p for p in set(old) - set(new) if first <= p <= last)
+            if lines and not changed and not dropped:
+                return 0
+
+            since_full = 0
+            for line in reversed(lines):
+                if line.get("full"):
+                    break
+                since_full += 1
+            if not lines or since_full >= FULL_EVERY:
+                state = {p: d for p, d in old.items() if p not in dropped}
+                state.update(changed)
+                line = {"asof": asof, "set": state, "full": True}
+            else:
+                line = {"asof": asof, "set": changed, "drop": dropped}
+
+            path = os.path.join(self.root, "refs", _key_fn(key))
+            with open(path, "a") as f:
+                f.write(json.dumps(line, separators=(",", ":")) + "\n")
+            lines.append(line)
+        return written
+
+    def read(self, key, asof=None):
+        """
+        Return key as known on asof (a date or "YYYY-MM-DD"; default: the
+        latest vintage) as a DataFrame with columns: date, value. Returns
+        None if the series was not recorded by then.
+        """
+        with self._lock:
+            lines = self._ref_lines(key)
+            if asof is None:
+                upto = len(lines)
+            else:
+                asof = asof if isinstance(asof, str) else asof.isoformat()
+                upto = bisect.bisect_right([line["asof"] for line in lines], asof)
+            if upto == 0:
+                return None
+            state = self._state(lines, upto)
+
+        parts = [self._get(state[period]) for period in sorted(state)]
+        if not parts:
+            return pd.DataFrame({"date": pd.to_datetime([]), "value": []})
+        dates = np.concatenate([p[0] for p in parts]).view("datetime64[ns]")
+        values = np.concatenate([p[1] for p in parts])
+        return pd.DataFrame({"date": dates, "value": values})
@@ -0,0 +1,104 @@
+# yield_curve.py
+"""
+The Treasury constant-maturity yield curve as a date x tenor matrix.
+
+build_curve() aligns the per-tenor series on date and fills the tenors a
+date is missing (e.g. 20 Yr in 1987-1993, 30 Yr in 2002-2006, 1 Mo before
+2001, 2 Mo before 2018, 4 Mo before 2022) by linear interpolation across
+maturities, flat beyond the shortest or longest quoted tenor, in one
+vectorized pass over all dates.
+interpolate_curve() evaluates the curve at any maturities, again for all
+dates at once, and curve_spread() gives the spread between any two tenors.
+"""
+
+import numpy as np
+import pandas as pd
+
+# (label, maturity in years)
+TENORS = [
+    ("1M", 1 / 12),
+    ("2M", 2 / 12),
+    ("3M", 0.25),
+    ("4M", 4 / 12),
+    ("6M", 0.5),
+    ("1Y", 1.0),
+    ("2Y", 2.0),
+    ("3Y", 3.0),
+    ("5Y", 5.0),
+    ("7Y", 7.0),
+    ("10Y", 10.0),
+    ("20Y", 20.0),
+    ("30Y", 30.0),
+]
+
+
+def _fill_tenors(maturities, Y):
+    """
+    Fill the NaNs of Y (dates x tenors) by linear interpolation along the
+    tenor axis, flat beyond the first/last valid tenor of each row.
+    """
+    m = Y.shape[1]
+    valid = ~np.isnan(Y)
+    idx = np.broadcast_to(np.arange(m), Y.shape)
+    left = np.maximum.accumulate(np.where(valid, idx, -1), axis=1)
+    right = np.minimum.accumulate(np.where(valid, idx, m)[:, ::-1], axis=1)[:, ::-1]
+    left, right = np.where(left < 0, right, left), np.where(right >= m, left, right)
+    left, right = left.clip(0, m - 1), right.clip(0, m - 1)
+
+    rows = np.arange(Y.shape[0])[:, None]
+    y_left, y_right = Y[rows, left], Y[rows, right]
+    t_left, t_right = maturities[left], maturities[right]
+    span = t_right - t_left
+    w = np.divide(maturities - t_left, span, out=np.zeros_like(span), where=span > 0)
+    return y_left + w * (y_right - y_left)
+
+
+def build_curve(series):
+    """
+    series: {tenor label: DataFrame with columns date, value}. Returns a
+    DataFrame with a date column and one column per tenor (in TENORS order),
+    gaps filled, for the dates on which at least two tenors are quoted.
+    """
+    labels = [label for label, _ in TENORS if label in series]
+    maturities = np.array([t for label, t in TENORS if label in series])
+    wide = pd.concat(
+        [series[label].set_index("date")["value"].rename(label) for label in labels],
+        axis=1,
+    ).sort_index()
+    wide = wide[wide.notna().sum(axis=1) >= 2]
+
+    filled = _fill_tenors(maturities, wide.to_numpy(dtype="float64"))
+    curve = pd.DataFrame(filled, columns=labels)
+    curve.insert(0, "date", wide.index.to_numpy())
+    return curve
+
+
+def curve_maturities(curve):
+    lookup = dict(TENORS)
+    return np.array([lookup[c] for c in curve.columns if c != "date"])
+
+
+def interpolate_curve(curve, maturities):
+    """
+    Yields at the given maturities (years) for every date of curve, as a
+    (dates x maturities) array: linear between the curve's tenors, flat
+    beyond them.
+    """
+    tenor_t = curve_maturities(curve)
+    Y = curve.drop(columns="date").to_numpy(dtype="float64")
+    maturities = np.clip(np.asarray(maturities, dtype="float64"), tenor_t[0], tenor_t[-1])
+    j = np.clip(np.searchsorted(tenor_t, maturities), 1, len(tenor_t) - 1)
+    w = (maturities - tenor_t[j - 1]) / (tenor_t[j] - tenor_t[j - 1])
+    return Y[:, j - 1] * (1 - w) + Y[:, j] * w
+
+
+def curve_spread(curve, short, long):
+    """
+    long minus short yield as a date/value DataFrame, e.g.
+    curve_spread(curve, "2Y", "10Y") for 2s10s. Tenors can be labels or
+    maturities in years.
+    """
+    lookup = dict(TENORS)
+    t = [lookup.get(x, x) for x in (short, long)]
+    values = interpolate_curve(curve, t)
+    return pd.DataFrame({"date": curve["date"].to_numpy(), "value": values[:, 1] - values[:, 0]})